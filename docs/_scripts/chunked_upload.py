@@ -0,0 +1,393 @@
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from tqdm import tqdm
+
+# The state of an interrupted upload is saved next to the uploaded file
+UPLOAD_STATE_SUFFIX = ".upload_state.json"
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """
+    Transient error of a storage, i.e., the chunk can be uploaded again.
+    """
+
+
+class UploadStorage(ABC):
+    """
+    Minimal interface of a storage that supports resumable uploads in chunks.
+    """
+
+    # The size of all chunks except the last one has to be a multiple of this
+    chunk_alignment = 1
+
+    @abstractmethod
+    def start_session(self, file_name: str, file_size: int) -> str:
+        """
+        Starts a new upload and returns the session that identifies it.
+        """
+
+    @abstractmethod
+    def query_offset(self, session: str, file_size: int) -> Optional[int]:
+        """
+        Returns the number of bytes the storage has committed or None if the session expired.
+        """
+
+    @abstractmethod
+    def upload_chunk(
+        self, session: str, data: bytes, offset: int, file_size: int
+    ) -> int:
+        """
+        Uploads the chunk starting at offset and returns the new number of committed bytes.
+        The storage may commit only a part of the chunk.
+        """
+
+    def checksum(self, session: str) -> Optional[str]:
+        """
+        Returns the MD5 of the completed upload as computed by the storage or None if it does not provide one.
+        """
+        return None
+
+
+def get_backoff_delay(attempt: int) -> float:
+    # Exponential backoff with jitter, such that parallel uploads do not retry in lockstep
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    return delay + random.uniform(0, BACKOFF_BASE_SECONDS)
+
+
+def compute_md5(file_name: str) -> str:
+    md5 = hashlib.md5()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class LocalStorage(UploadStorage):
+    """
+    Stores uploads in a local directory, e.g., as a stand-in for a remote storage in tests.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def start_session(self, file_name: str, file_size: int) -> str:
+        session = os.path.join(self.directory, os.path.basename(file_name) + ".part")
+        open(session, "wb").close()
+        return session
+
+    def query_offset(self, session: str, file_size: int) -> Optional[int]:
+        if not os.path.exists(session):
+            return None
+        return os.path.getsize(session)
+
+    def upload_chunk(
+        self, session: str, data: bytes, offset: int, file_size: int
+    ) -> int:
+        with open(session, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+        new_offset = offset + len(data)
+        if new_offset == file_size:
+            os.replace(session, session[: -len(".part")])
+        return new_offset
+
+    def checksum(self, session: str) -> Optional[str]:
+        return compute_md5(session[: -len(".part")])
+
+
+class GoogleDriveStorage(UploadStorage):
+    """
+    Resumable uploads to a Google Drive folder. An existing file with the same title gets a new revision.
+    """
+
+    UPLOAD_URL = "https://www.googleapis.com/upload/drive/v2/files"
+    # Google Drive requires chunks in multiples of 256 KiB
+    chunk_alignment = 256 * 1024
+
+    def __init__(self, drive_folder_id: str, credentials_file: str = "credentials.txt"):
+        # Only needed for this storage
+        import httplib2
+        from pydrive.auth import GoogleAuth
+        from pydrive.drive import GoogleDrive
+
+        gauth = GoogleAuth()
+        if os.path.exists(credentials_file):
+            gauth.LoadCredentialsFile(credentials_file)
+        else:
+            gauth.LocalWebserverAuth()
+            gauth.SaveCredentialsFile(credentials_file)
+        gauth.Authorize()
+
+        self.drive_folder_id = drive_folder_id
+        self._drive = GoogleDrive(gauth)
+        # Refreshes the access token if needed
+        self._http = gauth.http
+        self._transport_errors = (OSError, httplib2.HttpLib2Error)
+        # MD5 of the completed uploads as reported by Google Drive
+        self._checksums: Dict[str, str] = {}
+        # "Resume Incomplete" uses 308, which newer versions of httplib2 follow as a redirect
+        if hasattr(self._http, "redirect_codes"):
+            self._http.redirect_codes = self._http.redirect_codes - {308}
+
+    def start_session(self, file_name: str, file_size: int) -> str:
+        title = os.path.basename(file_name)
+        existing_files = self._drive.ListFile(
+            {
+                "q": f'"{self.drive_folder_id}" in parents and title = "{title}" and trashed=false'
+            }
+        ).GetList()
+        assert len(existing_files) <= 1
+
+        if existing_files:
+            url, method = f"{self.UPLOAD_URL}/{existing_files[0]['id']}", "PUT"
+        else:
+            url, method = self.UPLOAD_URL, "POST"
+        metadata = {"title": title, "parents": [{"id": self.drive_folder_id}]}
+        response, content = self._request(
+            f"{url}?uploadType=resumable",
+            method,
+            body=json.dumps(metadata),
+            headers={
+                "Content-Type": "application/json; charset=UTF-8",
+                "X-Upload-Content-Type": mimetypes.guess_type(title)[0]
+                or "application/octet-stream",
+                "X-Upload-Content-Length": str(file_size),
+            },
+        )
+        if response.status != 200:
+            raise RuntimeError(
+                f"Failed to start the upload ({response.status}): {content}"
+            )
+        return response["location"]
+
+    def query_offset(self, session: str, file_size: int) -> Optional[int]:
+        response, content = self._request(
+            session,
+            "PUT",
+            headers={"Content-Length": "0", "Content-Range": f"bytes */{file_size}"},
+        )
+        if response.status in (200, 201):
+            self._checksums[session] = json.loads(content)["md5Checksum"]
+            return file_size
+        if response.status == 404:
+            return None
+        return self._committed_bytes(response)
+
+    def upload_chunk(
+        self, session: str, data: bytes, offset: int, file_size: int
+    ) -> int:
+        response, content = self._request(
+            session,
+            "PUT",
+            body=data,
+            headers={
+                "Content-Length": str(len(data)),
+                "Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{file_size}",
+            },
+        )
+        if response.status in (200, 201):
+            uploaded_file = json.loads(content)
+            uploaded_size = int(uploaded_file["fileSize"])
+            if uploaded_size != file_size:
+                raise RuntimeError(
+                    f"Uploaded file has {uploaded_size} bytes instead of {file_size}."
+                )
+            self._checksums[session] = uploaded_file["md5Checksum"]
+            return file_size
+        return self._committed_bytes(response)
+
+    def checksum(self, session: str) -> Optional[str]:
+        return self._checksums.get(session)
+
+    def _request(self, url: str, method: str, body=None, headers=None):
+        try:
+            response, content = self._http.request(
+                url, method, body=body, headers=headers
+            )
+        except self._transport_errors as e:
+            raise UploadError(str(e)) from e
+        if response.status == 429 or response.status >= 500:
+            raise UploadError(f"Google Drive responded with {response.status}.")
+        return response, content
+
+    @staticmethod
+    def _committed_bytes(response) -> int:
+        # "Resume Incomplete" with the committed range, e.g., "bytes=0-1048575"
+        if response.status != 308:
+            raise RuntimeError(
+                f"Unexpected response of Google Drive: {response.status}"
+            )
+        if "range" not in response:
+            return 0
+        return int(response["range"].split("-")[-1]) + 1
+
+
+class ChunkedUploader:
+    """
+    Uploads a file in chunks. A failed chunk is retried and an interrupted upload is resumed from the bytes
+    the storage has committed, as long as size and modification time of the file did not change.
+    After the upload, the MD5 of the file is compared with the checksum computed by the storage.
+    """
+
+    def __init__(
+        self,
+        storage: UploadStorage,
+        file_name: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        if chunk_size % storage.chunk_alignment != 0:
+            raise ValueError(
+                f"Chunk size has to be a multiple of {storage.chunk_alignment} bytes."
+            )
+        self.storage = storage
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self._state_file = file_name + UPLOAD_STATE_SUFFIX
+
+        stat = os.stat(file_name)
+        self.file_size = stat.st_size
+        self._mtime_ns = stat.st_mtime_ns
+        self._session: Optional[str] = None
+        self.number_uploaded_bytes = 0
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=1) as hash_executor:
+            # The file is hashed in the background while it is uploaded
+            md5_future = hash_executor.submit(compute_md5, self.file_name)
+
+            offset = self._resume()
+            if offset is None:
+                self._session = self.storage.start_session(
+                    self.file_name, self.file_size
+                )
+                offset = 0
+                self._save_state()
+
+            with tqdm(
+                total=self.file_size,
+                initial=offset,
+                desc=f"Uploading {os.path.basename(self.file_name)}",
+                unit="B",
+                unit_scale=True,
+                unit_divisor=1024,
+            ) as pbar, open(self.file_name, "rb") as f:
+                # The storage can accept a chunk without committing any of its bytes
+                number_stalled_attempts = 0
+                while offset < self.file_size:
+                    f.seek(offset)
+                    data = f.read(self.chunk_size)
+                    new_offset = self._upload_chunk_with_retries(data, offset)
+                    if new_offset <= offset:
+                        if number_stalled_attempts == self.max_retries:
+                            raise RuntimeError(
+                                f"The storage did not commit any bytes at {offset} after {self.max_retries} retries."
+                            )
+                        time.sleep(get_backoff_delay(number_stalled_attempts))
+                        number_stalled_attempts += 1
+                        continue
+                    number_stalled_attempts = 0
+                    self.number_uploaded_bytes += new_offset - offset
+                    pbar.update(new_offset - offset)
+                    offset = new_offset
+
+            self._verify_checksum(md5_future.result())
+
+        os.remove(self._state_file)
+
+    def _verify_checksum(self, local_md5: str):
+        remote_md5 = self.storage.checksum(self._session)
+        if remote_md5 is None:
+            print(
+                "The storage does not provide a checksum, only the size was verified."
+            )
+        elif remote_md5 != local_md5:
+            # The next run starts from scratch
+            os.remove(self._state_file)
+            raise RuntimeError(
+                f"Checksum of the uploaded file ({remote_md5}) does not match the local file ({local_md5})."
+            )
+
+    def _upload_chunk_with_retries(self, data: bytes, offset: int) -> int:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.storage.upload_chunk(
+                    self._session, data, offset, self.file_size
+                )
+            except UploadError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = get_backoff_delay(attempt)
+                print(
+                    f"Uploading the chunk at {offset} failed ({e}). Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s."
+                )
+                time.sleep(delay)
+                # The storage might have committed a part of the chunk before the error
+                committed = self._query_offset()
+                if committed is None:
+                    raise RuntimeError(
+                        "The upload session expired, restart the upload."
+                    ) from e
+                if committed != offset:
+                    return committed
+        raise RuntimeError("Unreachable")
+
+    def _query_offset(self) -> Optional[int]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.storage.query_offset(self._session, self.file_size)
+            except UploadError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(
+                    min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+                )
+        raise RuntimeError("Unreachable")
+
+    def _resume(self) -> Optional[int]:
+        # Returns the offset to continue from or None if the upload has to start from scratch
+        if not os.path.exists(self._state_file):
+            return None
+        with open(self._state_file) as f:
+            state = json.load(f)
+        if [state["file_size"], state["mtime_ns"]] != [self.file_size, self._mtime_ns]:
+            print("The file changed since the last upload, starting from scratch.")
+            return None
+
+        self._session = state["session"]
+        offset = self._query_offset()
+        if offset is None:
+            print("The upload session expired, starting from scratch.")
+            return None
+        print(f"Resuming the upload at {offset / 1e6:.1f} MB.")
+        return offset
+
+    def _save_state(self):
+        # Written atomically, an interrupted write must not corrupt the state
+        tmp_file = self._state_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(
+                {
+                    "session": self._session,
+                    "file_size": self.file_size,
+                    "mtime_ns": self._mtime_ns,
+                },
+                f,
+            )
+        os.replace(tmp_file, self._state_file)
@@ -0,0 +1,197 @@
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict
+
+import supervisely_lib as sly
+from tqdm import tqdm
+
+# Maps the relative path of each verified image to its hash on Supervisely.
+#  It is saved next to the project folder, such that it does not end up in the zip file.
+DOWNLOAD_MANIFEST_SUFFIX = ".download_manifest.json"
+ANNOTATION_BATCH_SIZE = 50
+MAX_RETRIES = 3
+# The manifest is saved after this many images, i.e., an interrupted download loses at most these images
+MANIFEST_SAVE_INTERVAL = 200
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_hash(path: str) -> str:
+    # Same format as the hash in the image info of Supervisely: base64 encoded SHA-256
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return base64.b64encode(sha256.digest()).decode("utf-8")
+
+
+def write_json_if_changed(path: str, data) -> bool:
+    """
+    Writes the JSON file atomically and only if its content changed, such that unchanged files keep their
+    modification time. Returns True if the file was written.
+    """
+    content = json.dumps(data).encode("utf-8")
+    if os.path.exists(path) and os.path.getsize(path) == len(content):
+        with open(path, "rb") as f:
+            if f.read() == content:
+                return False
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(content)
+    os.replace(tmp_file, path)
+    return True
+
+
+class ProjectDownloader:
+    """
+    Downloads a Supervisely project in the same layout as sly.download_project().
+    Images are downloaded concurrently and verified by size and hash. Verified images are recorded in a manifest,
+    so an interrupted or repeated download skips them. Annotations are small and always downloaded again,
+    but only written if they changed.
+    """
+
+    def __init__(
+        self,
+        sly_api: sly.Api,
+        project_id: int,
+        download_path: str,
+        num_connections: int = 8,
+    ):
+        self.sly_api = sly_api
+        self.project_id = project_id
+        self.download_path = download_path
+        self.num_connections = num_connections
+
+        self.number_downloaded = 0
+        self.number_skipped = 0
+        self.number_updated_annotations = 0
+        self._manifest_file = os.path.normpath(download_path) + DOWNLOAD_MANIFEST_SUFFIX
+        self._manifest: Dict[str, str] = {}
+        if os.path.exists(self._manifest_file):
+            with open(self._manifest_file) as f:
+                self._manifest = json.load(f)
+
+    def run(self):
+        os.makedirs(self.download_path, exist_ok=True)
+        write_json_if_changed(
+            os.path.join(self.download_path, "meta.json"),
+            self.sly_api.project.get_meta(self.project_id),
+        )
+
+        try:
+            for dataset in self.sly_api.dataset.get_list(self.project_id):
+                self._download_dataset(dataset)
+        finally:
+            # Also after an error, such that the next run skips all images verified so far
+            self._save_manifest()
+
+        print(
+            f"Downloaded {self.number_downloaded} images, skipped {self.number_skipped} unchanged images, "
+            f"updated {self.number_updated_annotations} annotations."
+        )
+
+    def _download_dataset(self, dataset):
+        ann_dir = os.path.join(self.download_path, dataset.name, "ann")
+        img_dir = os.path.join(self.download_path, dataset.name, "img")
+        os.makedirs(ann_dir, exist_ok=True)
+        os.makedirs(img_dir, exist_ok=True)
+
+        images = self.sly_api.image.get_list(dataset.id)
+        self._remove_deleted_images(dataset.name, images)
+
+        for batch in sly.batched(images, batch_size=ANNOTATION_BATCH_SIZE):
+            annotations = self.sly_api.annotation.download_batch(
+                dataset.id, [image.id for image in batch]
+            )
+            for annotation in annotations:
+                self.number_updated_annotations += write_json_if_changed(
+                    os.path.join(ann_dir, f"{annotation.image_name}.json"),
+                    annotation.annotation,
+                )
+
+        pending = [image for image in images if not self._is_verified(dataset, image)]
+        self.number_skipped += len(images) - len(pending)
+
+        with ThreadPoolExecutor(max_workers=self.num_connections) as executor:
+            futures = {
+                executor.submit(self._download_image, dataset, image): image
+                for image in pending
+            }
+            with tqdm(
+                total=len(pending), desc=f"Downloading {dataset.name}", unit="images"
+            ) as pbar:
+                error = None
+                for future in as_completed(futures):
+                    image = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        # The other downloads are still recorded before the error is raised
+                        error = error or e
+                        continue
+                    self._manifest[
+                        self._relative_image_path(dataset, image)
+                    ] = image.hash
+                    self.number_downloaded += 1
+                    if self.number_downloaded % MANIFEST_SAVE_INTERVAL == 0:
+                        self._save_manifest()
+                    pbar.update(1)
+                if error is not None:
+                    raise error
+
+    def _download_image(self, dataset, image):
+        path = os.path.join(
+            self.download_path, self._relative_image_path(dataset, image)
+        )
+        for attempt in range(1, MAX_RETRIES + 1):
+            self.sly_api.image.download_path(image.id, path)
+            if self._is_valid_file(path, image):
+                return
+            print(
+                f"Verification of {path} failed (attempt {attempt}/{MAX_RETRIES}), downloading again."
+            )
+        raise RuntimeError(f"Failed to download {image.name} (id={image.id}).")
+
+    @staticmethod
+    def _relative_image_path(dataset, image) -> str:
+        return os.path.join(dataset.name, "img", image.name)
+
+    @staticmethod
+    def _is_valid_file(path: str, image) -> bool:
+        if not os.path.exists(path) or os.path.getsize(path) != image.size:
+            return False
+        # Fall back to the size check if Supervisely does not provide the hash
+        return image.hash is None or compute_file_hash(path) == image.hash
+
+    def _is_verified(self, dataset, image) -> bool:
+        relative_path = self._relative_image_path(dataset, image)
+        path = os.path.join(self.download_path, relative_path)
+        # Checking the size catches truncated files without hashing all images again
+        return (
+            relative_path in self._manifest
+            and self._manifest[relative_path] == image.hash
+            and os.path.exists(path)
+            and os.path.getsize(path) == image.size
+        )
+
+    def _remove_deleted_images(self, dataset_name: str, images):
+        # Images that have been deleted or renamed on Supervisely must not end up in the zip file
+        image_names = {image.name for image in images}
+        img_dir = os.path.join(self.download_path, dataset_name, "img")
+        ann_dir = os.path.join(self.download_path, dataset_name, "ann")
+        for image_name in os.listdir(img_dir):
+            if image_name not in image_names:
+                os.remove(os.path.join(img_dir, image_name))
+                self._manifest.pop(os.path.join(dataset_name, "img", image_name), None)
+        for ann_name in os.listdir(ann_dir):
+            if ann_name[: -len(".json")] not in image_names:
+                os.remove(os.path.join(ann_dir, ann_name))
+
+    def _save_manifest(self):
+        # Written atomically, an interrupted write must not corrupt the manifest
+        tmp_file = self._manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_file, self._manifest_file)
@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 import requests
 import argparse
@@ -14,10 +15,13 @@ img_stats_url = "https://drive.google.com/u/1/uc?id=1OtPr1xZR6Ntt_XOYHymzlh2_fed
 seg_stats_url = "https://drive.google.com/u/1/uc?id=1GOaH3itz7FaNXsH0PGFqRmlCqdlqJ3bd&export=download"
 seg_img_stats_url = "https://drive.google.com/u/1/uc?id=1nuZVEVeBw6F9pC7mhdw3mSnpm5POomgx&export=download"
 
-temp_box_df = "temp_box_stats.df"
-temp_img_df = "temp_img_stats.df"
-temp_seg_df = "temp_seg_stats.df"
-temp_seg_img_stats = "temp_seg_img_stats.df"
+temp_box_df = "temp_box_stats"
+temp_img_df = "temp_img_stats"
+temp_seg_df = "temp_seg_stats"
+temp_seg_img_stats = "temp_seg_img_stats"
+
+# Parquet files start with these magic bytes, older stats are pickled DataFrames
+PARQUET_MAGIC_BYTES = b"PAR1"
 
 
 def update_stats_badges(md_paths: [str], stats: dict):
@@ -100,34 +104,56 @@ def download_gdrive_df(df_url, fp):
     open(fp, "wb").write(r.content)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-d",
-        "--includes_directory",
-        type=str,
-        action="store",
-        required=False,
-        default="../_includes",
-        help="Path to the _includes directory of the FSOCO documentation website.",
-    )
+def read_stats_df(fp, columns: [str]) -> pd.DataFrame:
+    """
+    Reads the stats saved by collect-stats. Parquet files are read with column projection,
+    i.e., only the given columns are loaded.
+    """
+    with open(fp, "rb") as f:
+        is_parquet = f.read(len(PARQUET_MAGIC_BYTES)) == PARQUET_MAGIC_BYTES
+    if is_parquet:
+        return pd.read_parquet(fp, columns=columns)
+    return pd.read_pickle(fp)[columns]
 
-    args = parser.parse_args()
-    base_path = args.includes_directory
-    relative_paths = [os.path.join(base_path, path) for path in FILES]
 
-    logging.basicConfig(level=logging.INFO)
-    logging.info(f"Updating stats in the following files: {relative_paths}.")
+def load_summary(path_or_url: str) -> dict:
+    """
+    Loads a summary written by collect-stats from a local file or a URL.
+    """
+    if path_or_url.startswith("http"):
+        r = requests.get(path_or_url)
+        r.raise_for_status()
+        return r.json()
+    with open(path_or_url) as f:
+        return json.load(f)
+
 
+def stats_from_summaries(bbox_summary: dict, seg_summary: dict) -> dict:
+    # The keys match the id's of the span tags to be filled
+    stats = {
+        "num_bbox_images": bbox_summary["num_images"],
+        "num_bbox_cones": bbox_summary["num_boxes"],
+        "num_seg_images": seg_summary["num_images"],
+        "num_seg_cones": seg_summary["num_boxes"],
+        "num_teams": bbox_summary["num_teams"],
+        "num_teams_data": bbox_summary["num_teams_data"],
+    }
+    stats["avg_bbox_per_img"] = stats["num_bbox_cones"] / stats["num_bbox_images"]
+    stats["avg_seg_per_img"] = stats["num_seg_cones"] / stats["num_seg_images"]
+    return stats
+
+
+def stats_from_dataframes() -> dict:
     download_gdrive_df(box_stats_url, temp_box_df)
     download_gdrive_df(img_stats_url, temp_img_df)
     download_gdrive_df(seg_stats_url, temp_seg_df)
     download_gdrive_df(seg_img_stats_url, temp_seg_img_stats)
 
-    box_stats_df = pd.read_pickle(temp_box_df)
-    img_stats_df = pd.read_pickle(temp_img_df)
-    seg_stats_df = pd.read_pickle(temp_seg_df)
-    seg_img_stats_df = pd.read_pickle(temp_seg_img_stats)
+    # Only the number of rows, the teams, and the annotation files are required
+    box_stats_df = read_stats_df(temp_box_df, ["team_name", "ann_file"])
+    img_stats_df = read_stats_df(temp_img_df, ["team_name"])
+    seg_stats_df = read_stats_df(temp_seg_df, ["team_name"])
+    seg_img_stats_df = read_stats_df(temp_seg_img_stats, ["team_name"])
 
     # The keys match the id's of the span tags to be filled
     stats = {
@@ -147,14 +173,59 @@ def main():
         )
     )
 
-    update_stats_badges([relative_paths[1]], stats)
-    update_span_stats_pages([relative_paths[0]], stats)
-
     os.remove(temp_box_df)
     os.remove(temp_img_df)
     os.remove(temp_seg_df)
     os.remove(temp_seg_img_stats)
 
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--includes_directory",
+        type=str,
+        action="store",
+        required=False,
+        default="../_includes",
+        help="Path to the _includes directory of the FSOCO documentation website.",
+    )
+
+    parser.add_argument(
+        "--bbox_summary",
+        type=str,
+        required=False,
+        default=None,
+        help="Path or URL of the summary JSON written by collect-stats for the bounding box project."
+        " If both summaries are given, the per label stats are not downloaded.",
+    )
+    parser.add_argument(
+        "--seg_summary",
+        type=str,
+        required=False,
+        default=None,
+        help="Path or URL of the summary JSON written by collect-stats for the segmentation project.",
+    )
+
+    args = parser.parse_args()
+    base_path = args.includes_directory
+    relative_paths = [os.path.join(base_path, path) for path in FILES]
+
+    logging.basicConfig(level=logging.INFO)
+    logging.info(f"Updating stats in the following files: {relative_paths}.")
+
+    if args.bbox_summary is not None and args.seg_summary is not None:
+        stats = stats_from_summaries(
+            load_summary(args.bbox_summary), load_summary(args.seg_summary)
+        )
+    else:
+        stats = stats_from_dataframes()
+
+    update_stats_badges([relative_paths[1]], stats)
+    update_span_stats_pages([relative_paths[0]], stats)
+
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import os
 import supervisely_lib as sly
-from typing import List
-from tqdm import tqdm
-import zipfile
-from pydrive.auth import GoogleAuth
-from pydrive.drive import GoogleDrive
+from typing import List, Optional
 import shutil
 
+from chunked_upload import ChunkedUploader, GoogleDriveStorage
+from project_downloader import ProjectDownloader
+from zip_builder import SHARD_INDEX_SUFFIX, ZipBuilder, build_sharded_archives
+
 
 def download_dataset(
     sly_token: str,
@@ -17,6 +18,7 @@ def download_dataset(
     sly_workspace: str,
     sly_project: str,
     download_path: str,
+    num_connections: int = 8,
 ):
     SLY_ADDRESS = "https://app.supervise.ly"
 
@@ -40,57 +42,53 @@ def download_dataset(
     print(f"Workspace: id={workspace.id}, name={workspace.name}")
     print(f"Project: id={project.id}, name={project.name}")
 
-    sly.download_project(sly_api, project.id, download_path, log_progress=True)
+    # Resumes an interrupted download and skips images that are already up to date
+    ProjectDownloader(sly_api, project.id, download_path, num_connections).run()
 
 
-def zip_dataset(project_dir: str, zipfile_name: str, dataset_blacklist: List[str] = []):
+def zip_dataset(
+    project_dir: str,
+    zipfile_name: str,
+    dataset_blacklist: List[str] = [],
+    incremental: bool = True,
+    shard_by: Optional[str] = None,
+    max_shard_size_gb: float = 2.0,
+) -> List[str]:
+    # Returns the files to upload
     assert os.path.exists(project_dir)
+    assert shard_by in (None, "dataset", "size")
+
+    if shard_by is not None:
+        max_shard_bytes = int(max_shard_size_gb * 1e9) if shard_by == "size" else None
+        index = build_sharded_archives(
+            project_dir,
+            zipfile_name,
+            dataset_blacklist,
+            max_shard_bytes=max_shard_bytes,
+            incremental=incremental,
+        )
+        output_dir = os.path.dirname(zipfile_name)
+        # The index is uploaded last, such that it never references missing shards
+        return [
+            os.path.join(output_dir, shard["file"]) for shard in index["shards"]
+        ] + [os.path.splitext(zipfile_name)[0] + SHARD_INDEX_SUFFIX]
 
-    number_files = sum([len(files) for r, d, files in os.walk(download_path)])
-    with tqdm(total=number_files, desc="Zipping dataset", unit="files") as pbar:
-        with zipfile.ZipFile(zipfile_name, "w", zipfile.ZIP_DEFLATED) as zip_obj:
-            for foldername, subfolders, filenames in os.walk(project_dir):
-                for filename in filenames:
-                    file_path = os.path.join(foldername, filename)
-                    zip_file_path = file_path.replace(project_dir, "")
-                    dataset = zip_file_path.split("/")[1]
-                    if dataset not in dataset_blacklist:
-                        zip_obj.write(file_path, zip_file_path)
-                    pbar.set_postfix(dataset=dataset)
-                    pbar.update(1)
+    # Unchanged files are copied from the archive of the previous run
+    previous_zipfile_name = zipfile_name if incremental else None
+    with ZipBuilder(
+        zipfile_name, previous_zipfile_name=previous_zipfile_name
+    ) as zip_builder:
+        zip_builder.add_project(project_dir, dataset_blacklist)
+    return [zipfile_name]
 
 
 def upload_file(file_name: str, drive_folder_id: str):
     assert os.path.exists(file_name)
 
-    gauth = GoogleAuth()
-    if os.path.exists("credentials.txt"):
-        gauth.LoadCredentialsFile("credentials.txt")
-    else:
-        gauth.LocalWebserverAuth()
-        gauth.SaveCredentialsFile("credentials.txt")
-    drive = GoogleDrive(gauth)
-
-    file_drive = drive.ListFile(
-        {
-            "q": f'"{drive_folder_id}" in parents and title contains "{file_name}" and trashed=false'
-        }
-    ).GetList()
-    assert len(file_drive) <= 1
-
-    if not file_drive:
-        file_drive = drive.CreateFile(
-            {"title": file_name, "parents": [{"id": drive_folder_id}]}
-        )
-    else:
-        file_drive = file_drive[0]
-    prev_revision_id = file_drive.get("headRevisionId", "")
-
+    # A single request gets interrupted for such big files, so the file is uploaded in resumable chunks
     print(f"Uploading zip file: {file_name}")
-    file_drive.SetContentFile(file_name)
-    file_drive.Upload()
-
-    assert file_drive["headRevisionId"] != prev_revision_id
+    storage = GoogleDriveStorage(drive_folder_id, credentials_file="credentials.txt")
+    ChunkedUploader(storage, file_name).run()
 
 
 def update_stats(project_dir: str, cache_dir: str):
@@ -101,25 +99,37 @@ def update_stats(project_dir: str, cache_dir: str):
 
     if "Segmentation" in project_dir:
         os.rename(
-            os.path.join(cache_dir, "bboxes_train_bbox_stats.df"),
-            os.path.join(cache_dir, "Segmentation-BBoxes_bbox_stats.df"),
+            os.path.join(cache_dir, "bboxes_train_bbox_stats.parquet"),
+            os.path.join(cache_dir, "Segmentation-BBoxes_bbox_stats.parquet"),
+        )
+        os.rename(
+            os.path.join(cache_dir, "bboxes_train_image_stats.parquet"),
+            os.path.join(cache_dir, "Segmentation-BBoxes_image_stats.parquet"),
         )
         os.rename(
-            os.path.join(cache_dir, "bboxes_train_image_stats.df"),
-            os.path.join(cache_dir, "Segmentation-BBoxes_image_stats.df"),
+            os.path.join(cache_dir, "bboxes_train_mask_stats.parquet"),
+            os.path.join(cache_dir, "Segmentation-Masks_mask_stats.parquet"),
+        )
+        os.rename(
+            os.path.join(cache_dir, "bboxes_train_summary.json"),
+            os.path.join(cache_dir, "Segmentation_summary.json"),
         )
     else:
         os.rename(
-            os.path.join(cache_dir, "bboxes_train_bbox_stats.df"),
-            os.path.join(cache_dir, "Bounding_Boxes-train_bbox_stats.df"),
+            os.path.join(cache_dir, "bboxes_train_bbox_stats.parquet"),
+            os.path.join(cache_dir, "Bounding_Boxes-train_bbox_stats.parquet"),
+        )
+        os.rename(
+            os.path.join(cache_dir, "bboxes_train_image_stats.parquet"),
+            os.path.join(cache_dir, "Bounding_Boxes-train_image_stats.parquet"),
         )
         os.rename(
-            os.path.join(cache_dir, "bboxes_train_image_stats.df"),
-            os.path.join(cache_dir, "Bounding_Boxes-train_image_stats.df"),
+            os.path.join(cache_dir, "bboxes_train_summary.json"),
+            os.path.join(cache_dir, "Bounding_Boxes-train_summary.json"),
         )
 
 
-def main(sly_token: str, download_path: str):
+def main(sly_token: str, download_path: str, upload: bool = False):
     sly_team = "fsoco private"
     sly_workspace = "FSOCO"
     projects = {
@@ -135,6 +145,12 @@ def main(sly_token: str, download_path: str):
         #     "sly_project": "Segmentation",
         #     "zipfile": "fsoco_segmentation_train.zip",
         # },
+        # Optionally, the zip file is split into shards with an index, see zip_dataset()
+        # "bboxes_train_sharded": {
+        #     "sly_project": "Bounding_Boxes-train",
+        #     "zipfile": "fsoco_bounding_boxes_train.zip",
+        #     "shard_by": "dataset",
+        # },
         # "segmentation_early_adopters": {
         #     "sly_project": "Segmentation",
         #     "zipfile": "fsoco_segmentation_early_adopters.zip",
@@ -156,10 +172,18 @@ def main(sly_token: str, download_path: str):
             project_path,
         )
         dataset_blacklist = project_config.get("dataset_blacklist", [])
-        zip_dataset(project_path, project_config["zipfile"], dataset_blacklist)
+        upload_files = zip_dataset(
+            project_path,
+            project_config["zipfile"],
+            dataset_blacklist,
+            shard_by=project_config.get("shard_by"),
+        )
 
-        # The connection gets interrupted for such big files
-        # upload_zipfile(project_config["zipfile"], DRIVE_DATA_FOLDER_ID)
+        if upload:
+            for file_name in upload_files:
+                upload_file(file_name, DRIVE_DATA_FOLDER_ID)
+        else:
+            print(f"Skipping the upload of {', '.join(upload_files)}, see --upload.")
 
         update_stats(project_path, download_path)
 
@@ -170,10 +194,18 @@ def main(sly_token: str, download_path: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--upload",
+        action="store_true",
+        help="Upload the zip files to Google Drive, otherwise they are only built locally.",
+    )
+    args = parser.parse_args()
+
     sly_token = os.getenv("SLY_TOKEN")
     if sly_token is None:
         print('ERROR: cannot find environment variable "SLY_TOKEN"')
         sys.exit(-1)
 
     download_path = os.path.join(os.getcwd(), "tmp")
-    main(sly_token, download_path)
+    main(sly_token, download_path, args.upload)
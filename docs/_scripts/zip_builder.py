@@ -0,0 +1,395 @@
+import hashlib
+import json
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+# These files are already compressed, deflating them again costs time without reducing the size
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".zip"}
+DEFLATE_COMPRESSION_LEVEL = 6
+# Upper bound of deflated members waiting to be written per thread, keeps the memory usage constant
+MAX_PENDING_PER_THREAD = 4
+# The manifest is saved next to the archive and maps each member to (size, mtime in ns, CRC) of its source file
+MANIFEST_SUFFIX = ".manifest.json"
+CRC_CHUNK_SIZE = 1024 * 1024
+# The index lists the shards of a sharded archive, e.g., fsoco_bounding_boxes_train_index.json
+SHARD_INDEX_SUFFIX = "_index.json"
+SHARD_INDEX_VERSION = 1
+
+
+def iterate_project_files(
+    project_dir: str, dataset_blacklist: List[str] = ()
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (file path, archive name) of all files in the project, skipping blacklisted datasets.
+    """
+    for foldername, subfolders, filenames in os.walk(project_dir):
+        subfolders.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(foldername, filename)
+            arcname = os.path.relpath(file_path, project_dir).replace(os.sep, "/")
+            # The first folder is the dataset, files on the top level are not part of a dataset
+            dataset = arcname.split("/")[0]
+            if dataset not in dataset_blacklist:
+                yield file_path, arcname
+
+
+def is_stored(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in STORED_EXTENSIONS
+
+
+def deflate_file(file_path: str, arcname: str) -> Tuple[zipfile.ZipInfo, bytes]:
+    """
+    Compresses a file to a raw deflate stream that can be written with write_raw_member().
+    zlib releases the GIL, so multiple files can be compressed in parallel threads.
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    with open(file_path, "rb") as f:
+        data = f.read()
+    compressor = zlib.compressobj(DEFLATE_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+    zinfo.compress_size = len(compressed)
+    return zinfo, compressed
+
+
+def compute_crc(file_path: str) -> int:
+    crc = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CRC_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def read_raw_member(zip_obj: zipfile.ZipFile, zinfo: zipfile.ZipInfo) -> bytes:
+    """
+    Returns the compressed data of a member without decompressing it.
+    """
+    zip_obj.fp.seek(zinfo.header_offset)
+    header = struct.unpack(
+        zipfile.structFileHeader, zip_obj.fp.read(zipfile.sizeFileHeader)
+    )
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header of {zinfo.filename}")
+    # Skip the file name and the extra field of the local header
+    zip_obj.fp.seek(header[10] + header[11], os.SEEK_CUR)
+    return zip_obj.fp.read(zinfo.compress_size)
+
+
+class PreviousArchive:
+    """
+    Members of a previous archive are reused if their source file did not change. A file is unchanged if
+    size and modification time match the manifest, or otherwise, if size and CRC match the archive.
+    """
+
+    def __init__(self, zipfile_name: str):
+        self._zip_obj = zipfile.ZipFile(zipfile_name, "r")
+        self._members = {zinfo.filename: zinfo for zinfo in self._zip_obj.infolist()}
+        self._manifest: Dict[str, List[int]] = {}
+        manifest_file = zipfile_name + MANIFEST_SUFFIX
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                self._manifest = json.load(f)
+
+    def close(self):
+        self._zip_obj.close()
+
+    def find_unchanged_member(
+        self, file_path: str, arcname: str, stat: os.stat_result
+    ) -> Optional[zipfile.ZipInfo]:
+        # Thread-safe since the archive itself is not read
+        zinfo = self._members.get(arcname)
+        if zinfo is None or zinfo.file_size != stat.st_size:
+            return None
+        if self._manifest.get(arcname) == [stat.st_size, stat.st_mtime_ns, zinfo.CRC]:
+            return zinfo
+        if compute_crc(file_path) == zinfo.CRC:
+            return zinfo
+        return None
+
+    def copy_member(self, zinfo: zipfile.ZipInfo) -> Tuple[zipfile.ZipInfo, bytes]:
+        # Only copy the fields that are independent of the position in the archive
+        new_zinfo = zipfile.ZipInfo(zinfo.filename, zinfo.date_time)
+        new_zinfo.compress_type = zinfo.compress_type
+        new_zinfo.external_attr = zinfo.external_attr
+        new_zinfo.CRC = zinfo.CRC
+        new_zinfo.file_size = zinfo.file_size
+        new_zinfo.compress_size = zinfo.compress_size
+        return new_zinfo, read_raw_member(self._zip_obj, zinfo)
+
+
+def write_raw_member(zip_obj: zipfile.ZipFile, zinfo: zipfile.ZipInfo, raw_data):
+    """
+    Appends a member whose data is already compressed, i.e., CRC and sizes of zinfo have to be set.
+    The zipfile module only supports compressing the data itself while writing.
+    """
+    zip_obj._writecheck(zinfo)  # pylint: disable=protected-access
+    zip_obj._didModify = True  # pylint: disable=protected-access
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+
+    zip_obj.fp.seek(zip_obj.start_dir)
+    zinfo.header_offset = zip_obj.fp.tell()
+    zip_obj.fp.write(zinfo.FileHeader(zip64))
+    zip_obj.fp.write(raw_data)
+    zip_obj.start_dir = zip_obj.fp.tell()
+
+    zip_obj.filelist.append(zinfo)
+    zip_obj.NameToInfo[zinfo.filename] = zinfo
+
+
+class ZipBuilder:
+    """
+    Streams files into a zip archive. Compressed images are stored as they are and all other files are
+    deflated in a thread pool. Files are added while walking the project, i.e., without counting them first.
+    If a previous archive is given, the compressed data of unchanged files is copied from it.
+    """
+
+    def __init__(
+        self,
+        zipfile_name: str,
+        num_threads: Optional[int] = None,
+        previous_zipfile_name: Optional[str] = None,
+    ):
+        self.zipfile_name = zipfile_name
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.previous_zipfile_name = previous_zipfile_name
+        # The previous archive is read while writing, so it cannot be overwritten directly
+        self._output_name = zipfile_name
+        if previous_zipfile_name is not None and os.path.abspath(
+            previous_zipfile_name
+        ) == os.path.abspath(zipfile_name):
+            self._output_name = zipfile_name + ".tmp"
+
+        self.number_files = 0
+        self.number_reused = 0
+        self.number_bytes = 0  # Uncompressed size of all added files
+        self._start_time = None
+        self._zip_obj: Optional[zipfile.ZipFile] = None
+        self._previous_archive: Optional[PreviousArchive] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Tuple[str, str, Future]] = deque()
+        self._manifest: Dict[str, List[int]] = {}
+        self._pbar: Optional[tqdm] = None
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        if self.previous_zipfile_name is not None and os.path.exists(
+            self.previous_zipfile_name
+        ):
+            self._previous_archive = PreviousArchive(self.previous_zipfile_name)
+        self._zip_obj = zipfile.ZipFile(self._output_name, "w", allowZip64=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        self._pbar = tqdm(
+            desc="Zipping dataset", unit="B", unit_scale=True, unit_divisor=1024
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self._write_pending(0)
+        finally:
+            self._executor.shutdown()
+            self._zip_obj.close()
+            if self._previous_archive is not None:
+                self._previous_archive.close()
+            self._pbar.close()
+        if exc_type is not None:
+            return
+        if self._output_name != self.zipfile_name:
+            os.replace(self._output_name, self.zipfile_name)
+        with open(self.zipfile_name + MANIFEST_SUFFIX, "w") as f:
+            json.dump(self._manifest, f)
+        print(self.summary())
+
+    def add_file(self, file_path: str, arcname: str):
+        self._pending.append(
+            (
+                file_path,
+                arcname,
+                self._executor.submit(self._prepare_file, file_path, arcname),
+            )
+        )
+        self._write_pending(self.num_threads * MAX_PENDING_PER_THREAD)
+
+    def add_project(self, project_dir: str, dataset_blacklist: List[str] = ()):
+        for file_path, arcname in iterate_project_files(project_dir, dataset_blacklist):
+            self.add_file(file_path, arcname)
+            self._pbar.set_postfix(dataset=arcname.split("/")[0], refresh=False)
+
+    def throughput(self) -> float:
+        # MB/s of uncompressed data
+        duration = time.perf_counter() - self._start_time
+        return self.number_bytes / 1e6 / max(duration, 1e-9)
+
+    def summary(self) -> str:
+        summary = (
+            f"Zipped {self.number_files} files ({self.number_bytes / 1e6:.1f} MB) to {self.zipfile_name}"
+            + f" at {self.throughput():.1f} MB/s"
+        )
+        if self._previous_archive is not None:
+            summary += f", {self.number_reused} unchanged files copied from the previous archive"
+        return summary
+
+    def _prepare_file(self, file_path: str, arcname: str):
+        # Runs in the thread pool
+        stat = os.stat(file_path)
+        if self._previous_archive is not None:
+            zinfo = self._previous_archive.find_unchanged_member(
+                file_path, arcname, stat
+            )
+            if zinfo is not None:
+                return stat, zinfo, None
+        if is_stored(file_path):
+            return stat, None, None
+        return (stat, *deflate_file(file_path, arcname))
+
+    def _write_pending(self, max_pending: int):
+        # Members are written in the order they were added
+        while len(self._pending) > max_pending:
+            file_path, arcname, future = self._pending.popleft()
+            stat, zinfo, compressed = future.result()
+            if zinfo is None:
+                self._zip_obj.write(
+                    file_path, arcname, compress_type=zipfile.ZIP_STORED
+                )
+                zinfo = self._zip_obj.filelist[-1]
+            else:
+                if compressed is None:
+                    zinfo, compressed = self._previous_archive.copy_member(zinfo)
+                    self.number_reused += 1
+                write_raw_member(self._zip_obj, zinfo, compressed)
+
+            self._manifest[arcname] = [stat.st_size, stat.st_mtime_ns, zinfo.CRC]
+            self.number_files += 1
+            self.number_bytes += zinfo.file_size
+            self._pbar.update(zinfo.file_size)
+
+
+def plan_shards(
+    project_dir: str,
+    dataset_blacklist: List[str] = (),
+    max_shard_bytes: Optional[int] = None,
+) -> Tuple[List[Tuple[str, str]], Dict[str, List[Tuple[str, str]]]]:
+    """
+    Assigns the files of the project to shards, returns the files shared by all shards and the files per shard.
+    Without a byte budget, there is one shard per dataset. Otherwise, consecutive datasets are packed into shards
+    of at most max_shard_bytes, splitting datasets that do not fit into a single shard.
+    """
+    shared_files = []
+    dataset_files: Dict[str, List[Tuple[str, str, int]]] = {}
+    for file_path, arcname in iterate_project_files(project_dir, dataset_blacklist):
+        if "/" not in arcname:
+            # E.g., meta.json, every shard has to be a valid project on its own
+            shared_files.append((file_path, arcname))
+        else:
+            dataset_files.setdefault(arcname.split("/")[0], []).append(
+                (file_path, arcname, os.path.getsize(file_path))
+            )
+
+    shards: Dict[str, List[Tuple[str, str]]] = {}
+    if max_shard_bytes is None:
+        for dataset, files in dataset_files.items():
+            shards[dataset] = [(file_path, arcname) for file_path, arcname, _ in files]
+        return shared_files, shards
+
+    shard_files: List[Tuple[str, str]] = []
+    shard_bytes = 0
+    for files in dataset_files.values():
+        for file_path, arcname, file_size in files:
+            if shard_files and shard_bytes + file_size > max_shard_bytes:
+                shards[f"part{len(shards) + 1:03d}"] = shard_files
+                shard_files, shard_bytes = [], 0
+            shard_files.append((file_path, arcname))
+            shard_bytes += file_size
+    if shard_files:
+        shards[f"part{len(shards) + 1:03d}"] = shard_files
+    return shared_files, shards
+
+
+def compute_sha256(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CRC_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def build_sharded_archives(
+    project_dir: str,
+    zipfile_name: str,
+    dataset_blacklist: List[str] = (),
+    max_shard_bytes: Optional[int] = None,
+    incremental: bool = True,
+    num_threads: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Zips the project into shards next to zipfile_name, e.g., fsoco_bounding_boxes_train-ampera.zip, and writes
+    an index that maps each dataset to its shards. Consumers can download the shards in parallel and only
+    extract the datasets they need. Extracting several shards into the same folder results in a single project.
+    """
+    base_name = os.path.splitext(zipfile_name)[0]
+    index_file = base_name + SHARD_INDEX_SUFFIX
+    previous_shards = set()
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            previous_shards = {shard["file"] for shard in json.load(f)["shards"]}
+
+    shared_files, shards = plan_shards(project_dir, dataset_blacklist, max_shard_bytes)
+    index = {
+        "version": SHARD_INDEX_VERSION,
+        "sharding": "dataset" if max_shard_bytes is None else "size",
+        "shards": [],
+        "datasets": {},
+    }
+    for shard_name, files in shards.items():
+        shard_file = f"{base_name}-{shard_name}.zip"
+        # A shard is only reused if it has the same name, which is stable when sharding by dataset
+        with ZipBuilder(
+            shard_file,
+            num_threads,
+            previous_zipfile_name=shard_file if incremental else None,
+        ) as zip_builder:
+            for file_path, arcname in shared_files + files:
+                zip_builder.add_file(file_path, arcname)
+
+        datasets = sorted({arcname.split("/")[0] for _, arcname in files})
+        index["shards"].append(
+            {
+                "file": os.path.basename(shard_file),
+                "datasets": datasets,
+                "num_files": zip_builder.number_files,
+                "uncompressed_size": zip_builder.number_bytes,
+                "size": os.path.getsize(shard_file),
+                "sha256": compute_sha256(shard_file),
+            }
+        )
+        for dataset in datasets:
+            index["datasets"].setdefault(dataset, []).append(
+                os.path.basename(shard_file)
+            )
+
+    # Shards of the previous run that are no longer part of the archive, e.g., of a blacklisted dataset
+    output_dir = os.path.dirname(os.path.abspath(zipfile_name))
+    for stale_shard in previous_shards - {shard["file"] for shard in index["shards"]}:
+        stale_shard = os.path.join(output_dir, stale_shard)
+        for stale_file in (stale_shard, stale_shard + MANIFEST_SUFFIX):
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
+
+    # Written atomically, consumers must never see an index of shards that do not exist
+    with open(index_file + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_file + ".tmp", index_file)
+    print(f"Wrote {len(index['shards'])} shards, index: {index_file}")
+    return index
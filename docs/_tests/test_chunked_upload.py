@@ -0,0 +1,174 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "_scripts")
+)
+
+import chunked_upload  # noqa: E402
+from chunked_upload import (  # noqa: E402
+    UPLOAD_STATE_SUFFIX,
+    ChunkedUploader,
+    LocalStorage,
+    UploadError,
+)
+
+CHUNK_SIZE = 1024
+
+
+class StubStorage(LocalStorage):
+    """
+    Local storage that can fail, commit only a part of a chunk, or corrupt the uploaded data.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.uploaded_bytes = 0
+        self.transient_errors = 0  # Raise an UploadError for the next chunks
+        self.stalled_chunks = 0  # Commit no bytes of the next chunks
+        self.number_calls = 0
+        self.interrupt_at = None  # Abort the upload at this offset
+        self.partial_commit = False  # Commit only half of each chunk
+        self.corrupt = False
+
+    def upload_chunk(
+        self, session: str, data: bytes, offset: int, file_size: int
+    ) -> int:
+        self.number_calls += 1
+        if self.interrupt_at is not None and offset >= self.interrupt_at:
+            raise KeyboardInterrupt
+        if self.transient_errors > 0:
+            self.transient_errors -= 1
+            raise UploadError("Connection reset")
+        if self.stalled_chunks > 0:
+            self.stalled_chunks -= 1
+            return offset
+        if self.partial_commit and len(data) > 1:
+            data = data[: len(data) // 2]
+        if self.corrupt:
+            data = bytes(len(data))
+        self.uploaded_bytes += len(data)
+        return super().upload_chunk(session, data, offset, file_size)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(chunked_upload, "BACKOFF_BASE_SECONDS", 0.0)
+
+
+@pytest.fixture
+def upload_file(tmp_path):
+    file_name = tmp_path / "data.zip"
+    file_name.write_bytes(os.urandom(10 * CHUNK_SIZE + 123))
+    return file_name
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return StubStorage(str(tmp_path / "storage"))
+
+
+def _upload(storage, upload_file) -> ChunkedUploader:
+    uploader = ChunkedUploader(storage, str(upload_file), chunk_size=CHUNK_SIZE)
+    uploader.run()
+    return uploader
+
+
+def _uploaded_file(storage, upload_file) -> bytes:
+    with open(os.path.join(storage.directory, upload_file.name), "rb") as f:
+        return f.read()
+
+
+def test_upload(storage, upload_file):
+    _upload(storage, upload_file)
+
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+    assert storage.uploaded_bytes == upload_file.stat().st_size
+    assert not os.path.exists(str(upload_file) + UPLOAD_STATE_SUFFIX)
+
+
+def test_transient_errors_are_retried(storage, upload_file):
+    storage.transient_errors = chunked_upload.MAX_RETRIES
+
+    _upload(storage, upload_file)
+
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+
+
+def test_too_many_errors_fail(storage, upload_file):
+    storage.transient_errors = chunked_upload.MAX_RETRIES + 1
+
+    with pytest.raises(UploadError):
+        _upload(storage, upload_file)
+
+
+def test_partial_commits_are_continued(storage, upload_file):
+    storage.partial_commit = True
+
+    _upload(storage, upload_file)
+
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+
+
+def test_stalled_chunks_are_retried(storage, upload_file):
+    storage.stalled_chunks = chunked_upload.MAX_RETRIES
+
+    _upload(storage, upload_file)
+
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+
+
+def test_too_many_stalled_chunks_fail(storage, upload_file, monkeypatch):
+    storage.stalled_chunks = 1000
+    delays = []
+    monkeypatch.setattr(chunked_upload.time, "sleep", delays.append)
+
+    with pytest.raises(RuntimeError, match="did not commit"):
+        _upload(storage, upload_file)
+    assert storage.number_calls == chunked_upload.MAX_RETRIES + 1
+    # Each retry is delayed
+    assert len(delays) == chunked_upload.MAX_RETRIES
+
+
+def test_interrupted_upload_is_resumed(storage, upload_file):
+    storage.interrupt_at = 4 * CHUNK_SIZE
+    with pytest.raises(KeyboardInterrupt):
+        _upload(storage, upload_file)
+    assert os.path.exists(str(upload_file) + UPLOAD_STATE_SUFFIX)
+
+    storage.interrupt_at = None
+    uploader = _upload(storage, upload_file)
+
+    # Only the remaining bytes are uploaded again
+    assert uploader.number_uploaded_bytes == upload_file.stat().st_size - 4 * CHUNK_SIZE
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+
+
+def test_changed_file_is_uploaded_from_scratch(storage, upload_file):
+    storage.interrupt_at = 4 * CHUNK_SIZE
+    with pytest.raises(KeyboardInterrupt):
+        _upload(storage, upload_file)
+
+    storage.interrupt_at = None
+    upload_file.write_bytes(os.urandom(8 * CHUNK_SIZE))
+    uploader = _upload(storage, upload_file)
+
+    assert uploader.number_uploaded_bytes == upload_file.stat().st_size
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
+
+
+def test_checksum_mismatch_is_rejected(storage, upload_file):
+    storage.corrupt = True
+
+    with pytest.raises(RuntimeError, match="Checksum"):
+        _upload(storage, upload_file)
+    # The next upload starts from scratch
+    assert not os.path.exists(str(upload_file) + UPLOAD_STATE_SUFFIX)
+
+    storage.corrupt = False
+    uploader = _upload(storage, upload_file)
+
+    assert uploader.number_uploaded_bytes == upload_file.stat().st_size
+    assert _uploaded_file(storage, upload_file) == upload_file.read_bytes()
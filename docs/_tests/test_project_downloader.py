@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+from types import SimpleNamespace
+from typing import Dict
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "_scripts")
+)
+
+pytest.importorskip("supervisely_lib")
+
+from project_downloader import (  # noqa: E402
+    DOWNLOAD_MANIFEST_SUFFIX,
+    MAX_RETRIES,
+    ProjectDownloader,
+)
+
+DATASET = SimpleNamespace(id=1, name="team_a")
+
+
+def _hash(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("utf-8")
+
+
+class StubApi:
+    """
+    Stands in for sly.Api, serves the images from memory and counts the downloads.
+    """
+
+    def __init__(self, images: Dict[str, bytes]):
+        self.images = images
+        # The served content can differ from the hash reported in the image info
+        self.served_images = dict(images)
+        self.failing_images = set()  # Raise an error once when downloaded
+        self.annotations = {}  # Annotations with objects, the others are empty
+        self.downloads = []
+        self._lock = threading.Lock()
+
+        self.project = SimpleNamespace(get_meta=lambda project_id: {"classes": []})
+        self.dataset = SimpleNamespace(get_list=lambda project_id: [DATASET])
+        self.image = SimpleNamespace(
+            get_list=self._get_image_list, download_path=self._download_path
+        )
+        self.annotation = SimpleNamespace(download_batch=self._download_annotations)
+
+    def image_info(self, image_id: int):
+        name = sorted(self.images)[image_id]
+        data = self.images[name]
+        return SimpleNamespace(id=image_id, name=name, size=len(data), hash=_hash(data))
+
+    def _get_image_list(self, dataset_id: int):
+        return [self.image_info(image_id) for image_id in range(len(self.images))]
+
+    def _download_annotations(self, dataset_id: int, image_ids):
+        return [
+            SimpleNamespace(
+                image_name=self.image_info(image_id).name,
+                annotation=self.annotations.get(
+                    self.image_info(image_id).name, {"objects": []}
+                ),
+            )
+            for image_id in image_ids
+        ]
+
+    def _download_path(self, image_id: int, path: str):
+        name = self.image_info(image_id).name
+        with self._lock:
+            self.downloads.append(name)
+            if name in self.failing_images:
+                self.failing_images.remove(name)
+                raise ConnectionError(f"Connection lost while downloading {name}")
+        with open(path, "wb") as f:
+            f.write(self.served_images[name])
+
+
+@pytest.fixture
+def images():
+    return {f"image_{i}.jpg": os.urandom(1000 + i) for i in range(10)}
+
+
+def _run(sly_api, download_path, num_connections=4) -> ProjectDownloader:
+    downloader = ProjectDownloader(sly_api, 1, str(download_path), num_connections)
+    downloader.run()
+    return downloader
+
+
+def _load_manifest(download_path) -> dict:
+    with open(str(download_path) + DOWNLOAD_MANIFEST_SUFFIX) as f:
+        return json.load(f)
+
+
+def test_download_writes_project_layout(tmp_path, images):
+    sly_api = StubApi(images)
+    project_dir = tmp_path / "project"
+
+    downloader = _run(sly_api, project_dir)
+
+    assert downloader.number_downloaded == len(images)
+    for name, data in images.items():
+        assert (project_dir / DATASET.name / "img" / name).read_bytes() == data
+        assert (project_dir / DATASET.name / "ann" / f"{name}.json").exists()
+    assert (project_dir / "meta.json").exists()
+    assert len(_load_manifest(project_dir)) == len(images)
+
+
+def test_verified_images_are_skipped(tmp_path, images):
+    sly_api = StubApi(images)
+    project_dir = tmp_path / "project"
+    _run(sly_api, project_dir)
+    sly_api.downloads.clear()
+
+    downloader = _run(sly_api, project_dir)
+
+    assert sly_api.downloads == []
+    assert downloader.number_skipped == len(images)
+
+
+def test_changed_image_is_downloaded_again(tmp_path, images):
+    sly_api = StubApi(images)
+    project_dir = tmp_path / "project"
+    _run(sly_api, project_dir)
+    sly_api.downloads.clear()
+
+    sly_api.images["image_3.jpg"] = sly_api.served_images["image_3.jpg"] = b"new"
+    _run(sly_api, project_dir)
+
+    assert sly_api.downloads == ["image_3.jpg"]
+    assert (project_dir / DATASET.name / "img" / "image_3.jpg").read_bytes() == b"new"
+
+
+def test_resume_after_failed_download(tmp_path, images):
+    sly_api = StubApi(images)
+    sly_api.failing_images = {"image_4.jpg"}
+    project_dir = tmp_path / "project"
+
+    with pytest.raises(ConnectionError):
+        _run(sly_api, project_dir)
+    # All other images are verified and the manifest is saved despite the error
+    manifest = _load_manifest(project_dir)
+    assert len(manifest) == len(images) - 1
+    assert os.path.join(DATASET.name, "img", "image_4.jpg") not in manifest
+
+    sly_api.downloads.clear()
+    downloader = _run(sly_api, project_dir)
+
+    assert sly_api.downloads == ["image_4.jpg"]
+    assert downloader.number_skipped == len(images) - 1
+    assert len(_load_manifest(project_dir)) == len(images)
+
+
+def test_hash_mismatch_is_rejected(tmp_path, images):
+    sly_api = StubApi(images)
+    # Same size, different content
+    sly_api.served_images["image_2.jpg"] = bytes(len(images["image_2.jpg"]))
+    project_dir = tmp_path / "project"
+
+    with pytest.raises(RuntimeError, match="image_2.jpg"):
+        _run(sly_api, project_dir)
+
+    assert sly_api.downloads.count("image_2.jpg") == MAX_RETRIES
+    assert os.path.join(DATASET.name, "img", "image_2.jpg") not in _load_manifest(
+        project_dir
+    )
+
+
+def test_deleted_images_are_removed(tmp_path, images):
+    sly_api = StubApi(images)
+    project_dir = tmp_path / "project"
+    _run(sly_api, project_dir)
+
+    del sly_api.images["image_0.jpg"]
+    _run(sly_api, project_dir)
+
+    assert not (project_dir / DATASET.name / "img" / "image_0.jpg").exists()
+    assert not (project_dir / DATASET.name / "ann" / "image_0.jpg.json").exists()
+    assert os.path.join(DATASET.name, "img", "image_0.jpg") not in _load_manifest(
+        project_dir
+    )
+
+
+def test_unchanged_annotations_are_not_rewritten(tmp_path, images):
+    sly_api = StubApi(images)
+    project_dir = tmp_path / "project"
+    _run(sly_api, project_dir)
+    ann_dir = project_dir / DATASET.name / "ann"
+    mtimes = {
+        ann_file.name: ann_file.stat().st_mtime_ns for ann_file in ann_dir.iterdir()
+    }
+    # Make sure that a rewritten file gets a different modification time
+    for ann_file in ann_dir.iterdir():
+        os.utime(ann_file, ns=(0, mtimes[ann_file.name] - 10**9))
+        mtimes[ann_file.name] -= 10**9
+
+    sly_api.annotations["image_5.jpg"] = {"objects": [{"classTitle": "blue_cone"}]}
+    downloader = _run(sly_api, project_dir)
+
+    assert downloader.number_updated_annotations == 1
+    for ann_file in ann_dir.iterdir():
+        is_rewritten = ann_file.stat().st_mtime_ns != mtimes[ann_file.name]
+        assert is_rewritten == (ann_file.name == "image_5.jpg.json")
+    with open(ann_dir / "image_5.jpg.json") as f:
+        assert json.load(f) == sly_api.annotations["image_5.jpg"]
+    assert sorted(os.listdir(ann_dir)) == sorted(f"{name}.json" for name in images)
@@ -1,7 +1,13 @@
 import click
+import json
 from pathlib import Path
 from similarity_scorer.utils.logger import Logger
-from collect_stats.stats_collector import StatsCollector
+from collect_stats.stats_collector import (
+    StatsCollector,
+    STATS_FILE_SUFFIXES,
+    save_stats,
+)
+from collect_stats.stats_summary import summarize_stats
 
 
 @click.command()
@@ -12,7 +18,8 @@ from collect_stats.stats_collector import StatsCollector
 @click.option(
     "--num_workers",
     default=4,
-    help="Number of workers for feature extraction process, max number depends on GPU memory!",
+    help="Number of workers. With --calc_similarity, they are split between parsing the annotations and"
+    + " the feature extraction process, max number depends on GPU memory!",
     type=click.IntRange(1, 256),
 )
 @click.option("--gpu", is_flag=True, help="Use GPU for feature extraction")
@@ -22,12 +29,19 @@ from collect_stats.stats_collector import StatsCollector
     help="Specify the folder to save cache files in. If not specified, the current directory will be used.",
     type=click.Path(),
 )
+@click.option(
+    "--output_format",
+    type=click.Choice(["parquet", "pickle"], case_sensitive=False),
+    default="parquet",
+    help="Save the stats as typed Parquet files (default) or as pickled DataFrames (.df).",
+)
 def collect_stats(
     sly_project_name: str,
     calc_similarity: bool,
     num_workers: int,
     gpu: bool,
     cache_dir: Path,
+    output_format: str,
 ):
     """
     Collect stats from a local supervisely project for later analysis.
@@ -62,17 +76,30 @@ def collect_stats(
 
     collector = StatsCollector(calc_similarity, num_workers, gpu, cache_dir)
     if collector.load_sly_project(sly_project_name):
-        image_df, box_df = collector.collect_stats()
+        image_df, box_df, mask_df = collector.collect_stats()
 
-        image_df_filename = Path(f"{sly_project_name}_image_stats.df")
-        bbox_df_filename = Path(f"{sly_project_name}_bbox_stats.df")
+        suffix = STATS_FILE_SUFFIXES[output_format.lower()]
+        image_df_filename = Path(f"{sly_project_name}_image_stats{suffix}")
+        bbox_df_filename = Path(f"{sly_project_name}_bbox_stats{suffix}")
+        mask_df_filename = Path(f"{sly_project_name}_mask_stats{suffix}")
 
-        image_df.to_pickle(image_df_filename)
-        box_df.to_pickle(bbox_df_filename)
+        save_stats(image_df, image_df_filename)
+        save_stats(box_df, bbox_df_filename)
 
         Logger.log_info(f"Saved per image stats to '{image_df_filename}'")
         Logger.log_info(f"Saved per bounding box stats to '{bbox_df_filename}'")
 
+        # Only segmentation projects contain masks
+        if not mask_df.empty:
+            save_stats(mask_df, mask_df_filename)
+            Logger.log_info(f"Saved per mask stats to '{mask_df_filename}'")
+
+        # A few kilobytes that contain everything needed for the stats on the website
+        summary_filename = Path(f"{sly_project_name}_summary.json")
+        with open(summary_filename, "w") as f:
+            json.dump(summarize_stats(image_df, box_df, mask_df), f, indent=2)
+        Logger.log_info(f"Saved stats summary to '{summary_filename}'")
+
 
 if __name__ == "__main__":
     click.echo(
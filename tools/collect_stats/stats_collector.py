@@ -1,11 +1,20 @@
 import multiprocessing as mp
+from itertools import chain
 from similarity_scorer.utils.logger import Logger
 from tqdm import tqdm
 import json
+import os
+from math import floor
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import sys
-from typing import Optional
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from scipy import ndimage
 
 from similarity_scorer.similarity_scorer import SimilarityScorer
 from similarity_scorer.utils.cache import Cache
@@ -20,13 +29,95 @@ except ImportError:
     )
     sys.exit(-1)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Multiprocessing
 DEBUG_DISABLE_MULTIPROCESSING = False
 
 # Cache
-# If set to True, the feature vector is linked to
+# If set to True, the stats of an annotation file are reused as long as its content does not change.
+#  Size and modification time are only a fast pre-check, the CRC of the content decides if a file was rewritten,
+#  e.g., by downloading the project again. There is one cache file per dataset, such that only the datasets
+#  with changed annotations are rewritten.
 USE_CACHE = True
-CACHE_FILE = ".annotation_stats.cache"
+CACHE_DIR = ".annotation_stats_cache"
+# Increment if the format of the per image stats changes to invalidate existing cache entries
+ANNOTATION_STATS_VERSION = 3
+
+# Each worker gets at most this many annotation files per task to keep the IPC overhead low
+MAX_CHUNKSIZE = 64
+
+# Parse the annotation files with the SDK instead of reading the required fields from the JSON.
+#  Much slower, only meant to verify the results of the fast parser.
+DEBUG_USE_SDK_PARSER = False
+
+# will be initialized in every pool process!
+process_project_meta = None
+
+
+def _pool_process_init(project_meta_json: dict):
+    global process_project_meta
+    process_project_meta = sly.ProjectMeta.from_json(project_meta_json)
+
+
+def _get_chunksize(num_tasks: int, num_workers: int) -> int:
+    # About four chunks per worker balance the load while sending few messages
+    return max(1, min(MAX_CHUNKSIZE, num_tasks // (4 * num_workers)))
+
+
+# Column types of the saved stats. Columns that are not listed keep the type inferred by pandas.
+STATS_COLUMN_TYPES = {
+    "team_name": "category",
+    "class": "category",
+    "image_width": "int16",
+    "image_height": "int16",
+    "num_boxes": "int16",
+    "box_id": "int16",
+    "mid-x": "int16",
+    "mid-y": "int16",
+    "width": "int16",
+    "height": "int16",
+    "bbox_aspect_ratio": "float32",
+    "num_masks": "int16",
+    "mask_id": "int16",
+    "area": "int32",
+    "top": "int16",
+    "left": "int16",
+    "bbox_width": "int16",
+    "bbox_height": "int16",
+    "fill_ratio": "float32",
+    "num_components": "int16",
+}
+STATS_FILE_SUFFIXES = {"parquet": ".parquet", "pickle": ".df"}
+
+
+def convert_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype(
+        {
+            column: column_type
+            for column, column_type in STATS_COLUMN_TYPES.items()
+            if column in df.columns
+        }
+    )
+
+
+def save_stats(df: pd.DataFrame, filename: Path):
+    if filename.suffix == STATS_FILE_SUFFIXES["pickle"]:
+        df.to_pickle(filename)
+        return
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if "tags" in df.columns:
+        # Without any tags, the type would be inferred as list<null>
+        table = table.set_column(
+            table.schema.get_field_index("tags"),
+            "tags",
+            table.column("tags").cast(pa.list_(pa.string())),
+        )
+    pq.write_table(table, filename)
 
 
 def get_stat_template():
@@ -41,10 +132,145 @@ def get_stat_template():
     # label
     stat["num_boxes"] = 0
     stat["bounding_boxes"] = []
+    stat["num_masks"] = 0
+    stat["masks"] = []
 
     return stat
 
 
+def _load_json(path: str) -> dict:
+    with open(path, "rb") as json_file:
+        if orjson is not None:
+            return orjson.loads(json_file.read())
+        return json.load(json_file)
+
+
+def _get_box_stats(
+    class_name: str, tags: List[str], top: int, left: int, bottom: int, right: int
+) -> Dict[str, Any]:
+    # Same definition of width and height as sly.Rectangle, i.e., both corner pixels are included
+    w = right - left + 1
+    h = bottom - top + 1
+    return {
+        "class_name": class_name,
+        "tags": tags,
+        "x": int(left + w / 2),
+        "y": int(top + h / 2),
+        "width": w,
+        "height": h,
+        "aspect_ratio": float(w) / float(h),
+    }
+
+
+def _extract_boxes_from_json(data: dict) -> List[Dict[str, Any]]:
+    # Reads the rectangles directly from the JSON without constructing a sly.Annotation
+    bboxes = []
+    for label in data["objects"]:
+        if label["geometryType"] != "rectangle":
+            continue
+        (x_1, y_1), (x_2, y_2) = label["points"]["exterior"]
+        # sly.PointLocation floors the coordinates
+        x_1, y_1, x_2, y_2 = floor(x_1), floor(y_1), floor(x_2), floor(y_2)
+        bboxes.append(
+            _get_box_stats(
+                label["classTitle"],
+                # remove user metadata information
+                [tag["name"] for tag in label["tags"]],
+                min(y_1, y_2),
+                min(x_1, x_2),
+                max(y_1, y_2),
+                max(x_1, x_2),
+            )
+        )
+    return bboxes
+
+
+def _extract_boxes_with_sdk(data: dict) -> List[Dict[str, Any]]:
+    ann = sly.Annotation.from_json(data, process_project_meta)
+    bboxes = []
+    for label in ann.labels:
+        if type(label.geometry).__name__ == "Rectangle":
+            bboxes.append(
+                _get_box_stats(
+                    label.obj_class.name,
+                    [tag_dict["name"] for tag_dict in label.tags.to_json()],
+                    label.geometry.top,
+                    label.geometry.left,
+                    label.geometry.bottom,
+                    label.geometry.right,
+                )
+            )
+    return bboxes
+
+
+def _extract_masks_from_json(data: dict) -> List[Dict[str, Any]]:
+    # The masks are decoded directly from the base64 PNG without constructing a sly.Annotation
+    masks = []
+    for label in data["objects"]:
+        if label["geometryType"] != "bitmap":
+            continue
+        mask = sly.Bitmap.base64_2_data(label["bitmap"]["data"])
+        origin_x, origin_y = label["bitmap"]["origin"]
+
+        rows = np.flatnonzero(mask.any(axis=1))
+        columns = np.flatnonzero(mask.any(axis=0))
+        area = int(np.count_nonzero(mask))
+        if area == 0:
+            continue
+        bbox_height = int(rows[-1] - rows[0] + 1)
+        bbox_width = int(columns[-1] - columns[0] + 1)
+        _, num_components = ndimage.label(mask)
+
+        masks.append(
+            {
+                "class_name": label["classTitle"],
+                "tags": [tag["name"] for tag in label["tags"]],
+                "area": area,
+                "top": origin_y + int(rows[0]),
+                "left": origin_x + int(columns[0]),
+                "width": bbox_width,
+                "height": bbox_height,
+                "fill_ratio": area / (bbox_width * bbox_height),
+                "num_components": num_components,
+            }
+        )
+    return masks
+
+
+def _extract_stats_from_annotation_file(task: Tuple[str, str]):
+    team_name, ann_path = task
+    stats = get_stat_template()
+
+    data = _load_json(ann_path)
+
+    stats["team_name"] = team_name
+    stats["ann_file"] = ann_path
+
+    image_file = Path(ann_path.replace("/ann/", "/img/").replace(".json", ""))
+    if image_file.exists():
+        stats["image_file"] = str(image_file)
+    else:
+        # no image file or more filenames with different suffixes are already handled by sly sdk
+        stats["image_file"] = str(next(image_file.parent.glob(f"{image_file.stem}.*")))
+
+    stats["image_width"] = data["size"]["width"]
+    stats["image_height"] = data["size"]["height"]
+
+    if DEBUG_USE_SDK_PARSER:
+        bboxes = _extract_boxes_with_sdk(data)
+    else:
+        bboxes = _extract_boxes_from_json(data)
+
+    stats["num_boxes"] = len(bboxes)
+    stats["bounding_boxes"] = bboxes
+
+    masks = _extract_masks_from_json(data)
+    stats["num_masks"] = len(masks)
+    stats["masks"] = masks
+
+    return stats
+
+
 class StatsCollector:
     def __init__(
         self,
@@ -59,24 +285,17 @@ class StatsCollector:
         self.calc_similarity = calc_similarity
         self.num_workers = num_workers
         self.use_gpu = use_gpu
+        # Split of the worker budget if both phases run concurrently, see collect_stats()
+        self._annotation_workers = num_workers
+        self._similarity_workers = num_workers
 
         self.project = None
         self._current_dataset = None
 
-        self._cache = None
         self.cache_dir = cache_dir
-        self.cache_file = (
-            cache_dir / CACHE_FILE if cache_dir is not None else Path(CACHE_FILE)
+        self.cache_path = (
+            cache_dir / CACHE_DIR if cache_dir is not None else Path(CACHE_DIR)
         )
-        if USE_CACHE:
-            self._cache = Cache()
-            self._load_cache(self.cache_file)
-
-    def __del__(self):
-        if mp.current_process().name == "MainProcess":  # pylint: disable=not-callable
-            if USE_CACHE and self._cache is not None:
-                self._cache.store_to_file(self.cache_file)
-                Logger.log_info(f"Saved cache to [{self.cache_file}].")
 
     def load_sly_project(self, sly_project_name: str):
         try:
@@ -88,89 +307,60 @@ class StatsCollector:
             )
             return False
 
-    def _load_cache(self, cache_file: Path):
+    def _get_cache_file(self, dataset_name: str) -> Path:
+        return self.cache_path / self.project.name / f"{dataset_name}.cache"
+
+    @staticmethod
+    def _load_cache(cache_file: Path) -> Cache:
+        cache = Cache()
         if cache_file.exists():
-            if self._cache.load_from_file(cache_file):
+            if cache.load_from_file(cache_file):
                 Logger.log_info(f"Using cache file [{cache_file}].")
             else:
                 Logger.log_error(f"Failed to load cache from {cache_file}!")
+        return cache
+
+    @staticmethod
+    def _get_file_fingerprint(path: str) -> Tuple[str, int, int]:
+        # The path is part of the fingerprint since it is stored in the stats
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _get_file_crc(path: str) -> int:
+        with open(path, "rb") as f:
+            return zlib.crc32(f.read())
 
     def _collect_annotation_stats(self, ann_paths: list):
         stats = []
         if not ann_paths:
             return stats
 
+        # Only send the file paths and the dataset name, not the collector with its cache and project
+        tasks = [(self._current_dataset.name, ann_path) for ann_path in ann_paths]
+
         if DEBUG_DISABLE_MULTIPROCESSING:
-            for ann_path in tqdm(ann_paths):
-                res = self._extract_stats_from_annotation_file(ann_path)
+            _pool_process_init(self.project.meta.to_json())
+            for task in tqdm(tasks):
+                res = _extract_stats_from_annotation_file(task)
                 stats.append(res)
         else:
-            with tqdm(total=len(ann_paths)) as pbar:
-                with mp.Pool(self.num_workers) as pool:
+            with tqdm(total=len(tasks)) as pbar:
+                with mp.Pool(
+                    self._annotation_workers,
+                    initializer=_pool_process_init,
+                    initargs=(self.project.meta.to_json(),),
+                ) as pool:
                     for res in pool.imap(
-                        self._extract_stats_from_annotation_file, ann_paths
+                        _extract_stats_from_annotation_file,
+                        tasks,
+                        chunksize=_get_chunksize(len(tasks), self._annotation_workers),
                     ):
                         stats.append(res)
                         pbar.update(1)
 
         return stats
 
-    def _extract_stats_from_annotation_file(self, ann_path: str):
-        stats = get_stat_template()
-
-        with open(ann_path) as json_file:
-            data = json.load(json_file)
-
-        ann = sly.Annotation.from_json(data, self.project.meta)
-
-        stats["team_name"] = self._current_dataset.name
-        stats["ann_file"] = ann_path
-
-        image_file = Path(ann_path.replace("/ann/", "/img/").replace(".json", ""))
-        if image_file.exists():
-            stats["image_file"] = str(image_file)
-        else:
-            # no image file or more filenames with different suffixes are already handled by sly sdk
-            stats["image_file"] = str(
-                next(image_file.parent.glob(f"{image_file.stem}.*"))
-            )
-
-        stats["image_width"] = ann.img_size[1]
-        stats["image_height"] = ann.img_size[0]
-
-        bboxes = []
-
-        for label in ann.labels:
-            if type(label.geometry).__name__ == "Rectangle":
-                class_name = label.obj_class.name
-                cleaned_tags = list(
-                    map(lambda tag_dict: tag_dict["name"], label.tags.to_json())
-                )  # remove user metadata information
-                tags = cleaned_tags
-
-                x = int(label.geometry.left + label.geometry.width / 2)
-                y = int(label.geometry.top + label.geometry.height / 2)
-
-                w = label.geometry.width
-                h = label.geometry.height
-                aspect_ratio = float(w) / float(h)
-                bboxes.append(
-                    {
-                        "class_name": class_name,
-                        "tags": tags,
-                        "x": x,
-                        "y": y,
-                        "width": w,
-                        "height": h,
-                        "aspect_ratio": aspect_ratio,
-                    }
-                )
-
-        stats["num_boxes"] = len(bboxes)
-        stats["bounding_boxes"] = bboxes
-
-        return stats
-
     def _handle_dataset(self, dataset: sly.project.project.Dataset):
         self._current_dataset = dataset
         names, ann_paths = [], []
@@ -179,105 +369,181 @@ class StatsCollector:
             names.append(item_name)
             ann_paths.append(ann_path)
 
-        annotation_stats = []
+        annotation_stats = [None] * len(names)
+        fingerprints = [self._get_file_fingerprint(ann_path) for ann_path in ann_paths]
+        crcs = [None] * len(names)
+        # Indices of the annotation files without valid cache entries
+        changed_indices = list(range(len(names)))
+        # The cache is also saved if only the fingerprints of rewritten files changed
+        is_cache_updated = False
 
         if USE_CACHE:
-            recovered_from_cache_indices = []
-            for i, name in enumerate(names):
-                value = self._cache.get_cache_item(
-                    self.project.name, name, default_value=None
-                )
-                if value is not None:
-                    annotation_stats.append(value)
-                    recovered_from_cache_indices.append(i)
-            names = [
-                name
-                for i, name in enumerate(names)
-                if i not in recovered_from_cache_indices
-            ]
-            ann_paths = [
-                ann_path
-                for i, ann_path in enumerate(ann_paths)
-                if i not in recovered_from_cache_indices
-            ]
-
-        annotation_stats.extend(self._collect_annotation_stats(ann_paths))
+            cache_file = self._get_cache_file(dataset.name)
+            cache = self._load_cache(cache_file)
+            changed_indices = []
+            for i, (name, fingerprint) in enumerate(zip(names, fingerprints)):
+                value = cache.get_cache_item(self.project.name, name)
+                if value is None or value.get("version") != ANNOTATION_STATS_VERSION:
+                    changed_indices.append(i)
+                    continue
+                if value["fingerprint"] == fingerprint:
+                    crcs[i] = value["crc"]
+                    annotation_stats[i] = value["stats"]
+                    continue
+                # Path and size have to match, the content is only read if the modification time changed
+                if value["fingerprint"][:2] == fingerprint[:2]:
+                    crcs[i] = self._get_file_crc(ann_paths[i])
+                if crcs[i] == value["crc"]:
+                    annotation_stats[i] = value["stats"]
+                    is_cache_updated = True
+                else:
+                    changed_indices.append(i)
+            Logger.log_info(
+                f"Recovered {len(names) - len(changed_indices)} of {len(names)} annotations from cache."
+            )
 
-        if USE_CACHE:
-            for name, annotation_stat in zip(names, annotation_stats):
-                self._cache.add_cache_item(self.project.name, name, annotation_stat)
+        changed_stats = self._collect_annotation_stats(
+            [ann_paths[i] for i in changed_indices]
+        )
+        for i, annotation_stat in zip(changed_indices, changed_stats):
+            annotation_stats[i] = annotation_stat
+
+        if USE_CACHE and (changed_indices or is_cache_updated):
+            for i in changed_indices:
+                if crcs[i] is None:
+                    crcs[i] = self._get_file_crc(ann_paths[i])
+            # Rebuild the cache of this dataset to drop entries of deleted annotation files
+            cache = Cache()
+            for name, fingerprint, crc, annotation_stat in zip(
+                names, fingerprints, crcs, annotation_stats
+            ):
+                cache.add_cache_item(
+                    self.project.name,
+                    name,
+                    {
+                        "version": ANNOTATION_STATS_VERSION,
+                        "fingerprint": fingerprint,
+                        "crc": crc,
+                        "stats": annotation_stat,
+                    },
+                )
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache.store_to_file(cache_file)
+            Logger.log_info(f"Saved cache to [{cache_file}].")
 
         self._current_dataset = None
 
         return annotation_stats
 
-    def _collect_similarity_data(self):
+    def _start_similarity_collection(self) -> SimilarityScorer:
         Logger.log_info("start collecting similarity data.")
         img_glob = f"{self.project.directory}/*/img/*"
         similarity_scorer = SimilarityScorer(
             image_glob=img_glob,
             gpu=self.use_gpu,
-            num_workers=self.num_workers,
+            num_workers=self._similarity_workers,
             cache_dir=self.cache_dir,
         )
 
         similarity_scorer.per_folder_prefix = "team_"
 
-        similarity_stats = similarity_scorer.collect_stats(cache_use_file_hash=False)
+        similarity_scorer.start_collect_stats(cache_use_file_hash=False)
 
-        return similarity_stats
+        return similarity_scorer
 
     @staticmethod
-    def _extract_box_stats(annotation_stats: list):
-        box_rows = []
-        for image_row in annotation_stats:
-            for box_idx, bbox in enumerate(image_row["bounding_boxes"]):
-                class_name, tags, x, y, w, h, aspect_ratio = bbox.values()
-
-                box_rows.append(
-                    (
-                        image_row["team_name"],
-                        image_row["ann_file"],
-                        image_row["image_file"],
-                        image_row["image_width"],
-                        image_row["image_height"],
-                        box_idx,
-                        class_name,
-                        tags,
-                        x,
-                        y,
-                        w,
-                        h,
-                        aspect_ratio,
-                    )
-                )
+    def _explode_label_stats(
+        annotation_stats: list,
+        labels_key: str,
+        id_column: str,
+        label_columns: Dict[str, Tuple[str, Any]],
+    ) -> pd.DataFrame:
+        # The frame is built column by column. Image columns are repeated once per label.
+        num_labels = np.array(
+            [len(image_row[labels_key]) for image_row in annotation_stats],
+            dtype=np.int64,
+        )
+        total_labels = int(num_labels.sum())
+        labels = list(
+            chain.from_iterable(image_row[labels_key] for image_row in annotation_stats)
+        )
+
+        def image_column(key: str, dtype=object):
+            values = [image_row[key] for image_row in annotation_stats]
+            return np.repeat(np.array(values, dtype=dtype), num_labels)
+
+        def label_column(key: str, dtype):
+            if dtype is object:
+                # The dtype has to be given since pandas infers float64 without any labels
+                return pd.Series([label[key] for label in labels], dtype=object)
+            return np.fromiter(
+                (label[key] for label in labels), dtype=dtype, count=total_labels
+            )
+
+        # Index of the label within its image
+        first_label_indices = np.cumsum(num_labels) - num_labels
+        label_ids = np.arange(total_labels) - np.repeat(first_label_indices, num_labels)
+
+        return pd.DataFrame(
+            {
+                "team_name": pd.Categorical(image_column("team_name")),
+                "ann_file": image_column("ann_file"),
+                "image_file": image_column("image_file"),
+                "image_width": image_column("image_width", np.int64),
+                "image_height": image_column("image_height", np.int64),
+                id_column: label_ids,
+                "class": pd.Categorical(label_column("class_name", object)),
+                **{
+                    column: label_column(key, dtype)
+                    for column, (key, dtype) in label_columns.items()
+                },
+            }
+        )
 
-        box_df = pd.DataFrame(
-            box_rows,
-            columns=[
-                "team_name",
-                "ann_file",
-                "image_file",
-                "image_width",
-                "image_height",
-                "box_id",
-                "class",
-                "tags",
-                "mid-x",
-                "mid-y",
-                "width",
-                "height",
-                "bbox_aspect_ratio",
-            ],
+    @staticmethod
+    def _extract_box_stats(annotation_stats: list):
+        box_df = StatsCollector._explode_label_stats(
+            annotation_stats,
+            "bounding_boxes",
+            "box_id",
+            {
+                "tags": ("tags", object),
+                "mid-x": ("x", np.int64),
+                "mid-y": ("y", np.int64),
+                "width": ("width", np.int64),
+                "height": ("height", np.int64),
+                "bbox_aspect_ratio": ("aspect_ratio", np.float64),
+            },
         )
 
-        Logger.log_info(f"Extracted {len(box_rows)} bounding boxes.")
+        Logger.log_info(f"Extracted {len(box_df)} bounding boxes.")
         return box_df
 
+    @staticmethod
+    def _extract_mask_stats(annotation_stats: list):
+        mask_df = StatsCollector._explode_label_stats(
+            annotation_stats,
+            "masks",
+            "mask_id",
+            {
+                "tags": ("tags", object),
+                "area": ("area", np.int64),
+                "top": ("top", np.int64),
+                "left": ("left", np.int64),
+                "bbox_width": ("width", np.int64),
+                "bbox_height": ("height", np.int64),
+                "fill_ratio": ("fill_ratio", np.float64),
+                "num_components": ("num_components", np.int64),
+            },
+        )
+
+        Logger.log_info(f"Extracted {len(mask_df)} segmentation masks.")
+        return mask_df
+
     @staticmethod
     def _merge_stats(annotation_stats: list, similarity_stats: pd.DataFrame):
         image_df = pd.DataFrame(annotation_stats)
-        image_df.drop(columns=["bounding_boxes"], inplace=True)
+        image_df.drop(columns=["bounding_boxes", "masks"], inplace=True)
 
         if similarity_stats is None:
             return image_df
@@ -300,14 +566,36 @@ class StatsCollector:
     def collect_stats(self):
         annotation_stats = []
         similarity_stats = None
-        for dataset in self.project:
-            Logger.log_info(f"Extract stats for dataset '{dataset.name}'.")
-            annotation_stats.extend(self._handle_dataset(dataset))
 
+        # The similarity data is extracted from the images by its own process pool, while the annotation files
+        #  are parsed. Both phases share the worker budget. All pools are created and consumed by the main thread,
+        #  forking from a process with other threads running can deadlock, e.g., with PyTorch loaded.
+        similarity_scorer = None
         if self.calc_similarity:
-            similarity_stats = self._collect_similarity_data()
+            self._annotation_workers = max(1, self.num_workers // 2)
+            self._similarity_workers = max(
+                1, self.num_workers - self._annotation_workers
+            )
+            similarity_scorer = self._start_similarity_collection()
+
+        try:
+            for dataset in self.project:
+                Logger.log_info(f"Extract stats for dataset '{dataset.name}'.")
+                annotation_stats.extend(self._handle_dataset(dataset))
+        except BaseException:
+            if similarity_scorer is not None:
+                similarity_scorer.extractor.abort_extraction()
+            raise
+
+        if similarity_scorer is not None:
+            similarity_stats = similarity_scorer.finish_collect_stats()
 
         box_df = self._extract_box_stats(annotation_stats)
+        mask_df = self._extract_mask_stats(annotation_stats)
         image_df = self._merge_stats(annotation_stats, similarity_stats)
 
-        return image_df, box_df
+        return (
+            convert_column_types(image_df),
+            convert_column_types(box_df),
+            convert_column_types(mask_df),
+        )
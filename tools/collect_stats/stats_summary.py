@@ -0,0 +1,99 @@
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_VERSION = 1
+
+# Bin edges of the histograms, the last bin is open
+SIZE_BINS = [0, 8, 16, 32, 64, 128, 256, 512, 1024, np.inf]
+AREA_BINS = [0, 64, 256, 1024, 4096, 16384, 65536, 262144, np.inf]
+ASPECT_RATIO_BINS = [0, 0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0, np.inf]
+FILL_RATIO_BINS = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def _counts(column: pd.Series) -> Dict[str, int]:
+    return {
+        str(key): int(value)
+        for key, value in column.value_counts(sort=True).items()
+        if value > 0
+    }
+
+
+def _tag_counts(tags: pd.Series) -> Dict[str, int]:
+    return _counts(tags.explode().dropna())
+
+
+def _histogram(column: pd.Series, bins: List[float]) -> Dict[str, List[float]]:
+    counts, _ = np.histogram(column.to_numpy(dtype=np.float64), bins=bins)
+    # inf is not valid JSON
+    edges = [edge if np.isfinite(edge) else None for edge in bins]
+    return {"bin_edges": edges, "counts": counts.tolist()}
+
+
+def _quantiles(column: pd.Series) -> Dict[str, float]:
+    if column.empty:
+        return {}
+    values = column.astype(np.float64).quantile(QUANTILES)
+    return {str(q): round(float(value), 4) for q, value in values.items()}
+
+
+def _team_prefixes(ann_files: pd.Series) -> pd.Series:
+    # The annotation files are prefixed with the team that labeled the images
+    return ann_files.astype(str).map(lambda fp: os.path.basename(fp).split("_")[0])
+
+
+def summarize_stats(
+    image_df: pd.DataFrame, box_df: pd.DataFrame, mask_df: pd.DataFrame
+) -> Dict[str, Any]:
+    """
+    Aggregates the per image and per label stats to a compact summary, e.g., for the stats on the website.
+    """
+    summary = {
+        "version": SUMMARY_VERSION,
+        "num_images": len(image_df),
+        "num_boxes": len(box_df),
+        "num_masks": len(mask_df),
+        "num_teams": int(box_df["team_name"].nunique()),
+        "num_teams_data": int(_team_prefixes(box_df["ann_file"]).nunique()),
+        "images_per_team": _counts(image_df["team_name"]),
+    }
+
+    if not box_df.empty:
+        summary["boxes"] = {
+            "per_team": _counts(box_df["team_name"]),
+            "per_class": _counts(box_df["class"]),
+            "per_tag": _tag_counts(box_df["tags"]),
+            "width": {
+                "histogram": _histogram(box_df["width"], SIZE_BINS),
+                "quantiles": _quantiles(box_df["width"]),
+            },
+            "height": {
+                "histogram": _histogram(box_df["height"], SIZE_BINS),
+                "quantiles": _quantiles(box_df["height"]),
+            },
+            "aspect_ratio": {
+                "histogram": _histogram(box_df["bbox_aspect_ratio"], ASPECT_RATIO_BINS),
+                "quantiles": _quantiles(box_df["bbox_aspect_ratio"]),
+            },
+        }
+
+    if not mask_df.empty:
+        summary["masks"] = {
+            "per_team": _counts(mask_df["team_name"]),
+            "per_class": _counts(mask_df["class"]),
+            "per_tag": _tag_counts(mask_df["tags"]),
+            "area": {
+                "histogram": _histogram(mask_df["area"], AREA_BINS),
+                "quantiles": _quantiles(mask_df["area"]),
+            },
+            "fill_ratio": {
+                "histogram": _histogram(mask_df["fill_ratio"], FILL_RATIO_BINS),
+                "quantiles": _quantiles(mask_df["fill_ratio"]),
+            },
+            "num_components": _counts(mask_df["num_components"]),
+        }
+
+    return summary
@@ -0,0 +1,157 @@
+import errno
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2 as cv
+
+# Same as the default of OpenCV
+DEFAULT_JPEG_QUALITY = 95
+
+JPEG_EXTENSIONS = {".jpg", ".jpeg"}
+# Start of frame markers, i.e., all SOFn except DHT (C4), JPG (C8), and DAC (CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD}
+JPEG_HEADER_BYTES = 64 * 1024
+
+# Only checked once per process
+JPEGTRAN = shutil.which("jpegtran")
+
+LINK_MODES = ("copy", "hardlink", "symlink", "reflink")
+# ioctl of Linux to share the data blocks of two files, e.g., on Btrfs or XFS
+FICLONE = 0x40049409
+# Errors of links that are not supported between the source and the destination
+LINK_UNSUPPORTED_ERRORS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EINVAL,
+}
+
+
+def _reflink(src_file: Path, dst_file: Path):
+    import fcntl  # Not available on Windows
+
+    with open(src_file, "rb") as src, open(dst_file, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def export_file(src_file: Path, dst_file: Path, link_mode: str = "copy"):
+    """
+    Exports a file without changing its content, either as a copy or as a link to the source file.
+    Hard links and reflinks fall back to a copy if the file system does not support them,
+    e.g., if the source and the destination are on different file systems.
+    Note that editing a hard linked or symlinked file also changes the source file.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link_mode}")
+    # Same as copying, an existing file is overwritten
+    if os.path.lexists(dst_file):
+        os.remove(dst_file)
+
+    try:
+        if link_mode == "hardlink":
+            os.link(src_file, dst_file)
+            return
+        if link_mode == "symlink":
+            os.symlink(os.path.abspath(src_file), dst_file)
+            return
+        if link_mode == "reflink":
+            _reflink(src_file, dst_file)
+            return
+    except (OSError, ImportError) as e:
+        if isinstance(e, OSError) and e.errno not in LINK_UNSUPPORTED_ERRORS:
+            raise
+        if os.path.lexists(dst_file):
+            os.remove(dst_file)
+    shutil.copy(src_file, dst_file)
+
+
+def read_jpeg_frame(src_file: Path) -> Optional[Tuple[int, int, int, int, bool]]:
+    """
+    Returns (width, height, MCU width, MCU height, has EXIF) from the header of a JPEG or None for other files.
+    """
+    with open(src_file, "rb") as f:
+        data = f.read(JPEG_HEADER_BYTES)
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    has_exif = False
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        segment_length = int.from_bytes(data[position + 2 : position + 4], "big")
+        if marker == 0xE1 and data[position + 4 : position + 8] == b"Exif":
+            has_exif = True
+        if marker in JPEG_SOF_MARKERS:
+            segment = data[position + 4 : position + 2 + segment_length]
+            height = int.from_bytes(segment[1:3], "big")
+            width = int.from_bytes(segment[3:5], "big")
+            number_components = segment[5]
+            # Sampling factors are stored as 4 bits each in the third byte of each component
+            sampling_factors = [
+                segment[6 + 3 * i + 1] for i in range(number_components)
+            ]
+            max_horizontal = max(factor >> 4 for factor in sampling_factors)
+            max_vertical = max(factor & 0x0F for factor in sampling_factors)
+            return width, height, 8 * max_horizontal, 8 * max_vertical, has_exif
+        position += 2 + segment_length
+    return None
+
+
+def _crop_jpeg_lossless(src_file: Path, dst_file: Path, border: int) -> bool:
+    # Cropping in the DCT domain requires the top left corner to be aligned with the MCUs,
+    #  the bottom right corner is arbitrary. Returns False if this is not possible.
+    if JPEGTRAN is None or src_file.suffix.lower() not in JPEG_EXTENSIONS:
+        return False
+    frame = read_jpeg_frame(src_file)
+    if frame is None:
+        return False
+    width, height, mcu_width, mcu_height, has_exif = frame
+    # OpenCV applies the EXIF orientation, which jpegtran would ignore
+    if has_exif:
+        return False
+    if border % mcu_width != 0 or border % mcu_height != 0:
+        return False
+
+    crop = f"{width - 2 * border}x{height - 2 * border}+{border}+{border}"
+    result = subprocess.run(
+        [
+            JPEGTRAN,
+            "-perfect",
+            "-copy",
+            "none",
+            "-crop",
+            crop,
+            "-outfile",
+            str(dst_file),
+            str(src_file),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return result.returncode == 0
+
+
+def crop_image_border(
+    src_file: Path,
+    dst_file: Path,
+    border: int,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+):
+    """
+    Removes a border of the given thickness from all sides of the image.
+    JPEGs are cropped losslessly with jpegtran if the border is aligned with the MCUs, i.e., multiples of 8 or 16 px.
+    Otherwise, the image is decoded, cropped, and encoded again with the given JPEG quality.
+    """
+    if _crop_jpeg_lossless(src_file, dst_file, border):
+        return
+
+    image = cv.imread(str(src_file))
+    cropped_image = image[border:-border, border:-border, :]
+    cv.imwrite(str(dst_file), cropped_image, [cv.IMWRITE_JPEG_QUALITY, jpeg_quality])
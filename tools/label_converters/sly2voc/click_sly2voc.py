@@ -1,6 +1,7 @@
 import click
 
 from .sly2voc import main
+from ..image_export import LINK_MODES
 
 
 @click.command()
@@ -8,12 +9,31 @@ from .sly2voc import main
 @click.argument("output_folder", type=str)
 @click.option("--remove_watermark", is_flag=True, default=False)
 @click.option("--merge", is_flag=True, default=False)
-def sly2voc(sly_project_folder, output_folder, remove_watermark, merge):
+@click.option(
+    "--jpeg_quality",
+    type=click.IntRange(0, 100),
+    default=95,
+    help="JPEG quality of images that are encoded again to remove the watermark",
+)
+@click.option(
+    "--link_mode",
+    type=click.Choice(LINK_MODES),
+    default="copy",
+    help="How images are exported if the watermark is not removed",
+)
+def sly2voc(
+    sly_project_folder, output_folder, remove_watermark, merge, jpeg_quality, link_mode
+):
     """
     Supervisely  => Pascal VOC format
 
     https://docs.supervise.ly/ann_format/
 
+    \b
+    Use --link_mode hardlink/symlink/reflink to export the images without copying them if the watermark is kept.
+    Hard links and reflinks fall back to copying if the output folder is on a different file system.
+    Note that editing a hard linked or symlinked image also changes the original image.
+
     \b
     Input:
     project_name
@@ -46,7 +66,14 @@ def sly2voc(sly_project_folder, output_folder, remove_watermark, merge):
 
     """
     click.echo("[LOG] Running Supervisely to Pascal VOC label converter")
-    main(sly_project_folder, output_folder, remove_watermark, merge)
+    main(
+        sly_project_folder,
+        output_folder,
+        remove_watermark,
+        merge,
+        jpeg_quality,
+        link_mode,
+    )
 
 
 if __name__ == "__main__":
@@ -4,7 +4,6 @@ from collections import defaultdict
 import os
 import shutil
 
-import cv2 as cv
 from multiprocessing import Pool
 from tqdm import tqdm
 from functools import partial
@@ -17,6 +16,7 @@ from supervisely_lib.geometry.rectangle import Rectangle
 from typing import Dict
 
 from watermark.watermark import FSOCO_IMPORT_BORDER_THICKNESS
+from ..image_export import DEFAULT_JPEG_QUALITY, crop_image_border, export_file
 
 OUT_IMG_EXT = ".jpg"
 XML_EXT = ".xml"
@@ -40,7 +40,12 @@ def get_total_num_images(project: Project):
 
 
 def iterate_project(
-    save_path: Path, project: Project, remove_watermark: bool, merge: bool
+    save_path: Path,
+    project: Project,
+    remove_watermark: bool,
+    merge: bool,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+    link_mode: str = "copy",
 ):
     # Create root pascal 'datasets' folders
     with tqdm(
@@ -63,7 +68,14 @@ def iterate_project(
             lists_dir.mkdir(exist_ok=True, parents=True)
 
             samples_by_tags = iterate_dataset(
-                dataset, images_dir, anns_dir, project, remove_watermark, pbar
+                dataset,
+                images_dir,
+                anns_dir,
+                project,
+                remove_watermark,
+                jpeg_quality,
+                link_mode,
+                pbar,
             )
             save_images_lists(lists_dir, samples_by_tags)
 
@@ -74,6 +86,8 @@ def iterate_dataset(
     anns_dir: Path,
     project: Project,
     remove_watermark: bool,
+    jpeg_quality: int,
+    link_mode: str,
     pbar: tqdm,
 ):
     samples_by_tags = defaultdict(list)  # TRAIN: [img_1, img2, ..]
@@ -85,6 +99,8 @@ def iterate_dataset(
         anns_dir,
         project,
         remove_watermark,
+        jpeg_quality,
+        link_mode,
     )
 
     with Pool() as p:
@@ -104,32 +120,35 @@ def export_image(
     src_file: Path,
     new_file_name: str,
     remove_watermark: bool,
+    jpeg_quality: int,
+    link_mode: str,
 ):
     if remove_watermark:
-        rescale_copy_image(voc_export_images_dir, src_file, new_file_name)
+        rescale_copy_image(voc_export_images_dir, src_file, new_file_name, jpeg_quality)
     else:
-        copy_image(voc_export_images_dir, src_file, new_file_name)
-
+        copy_image(voc_export_images_dir, src_file, new_file_name, link_mode)
 
-def copy_image(voc_export_images_dir: Path, src_file: Path, new_file_name: str):
-    old_file_name = src_file.name
-    shutil.copy(src_file, voc_export_images_dir)
-
-    dst_file = voc_export_images_dir / old_file_name
-    new_dst_file_name = voc_export_images_dir / new_file_name
-    os.rename(dst_file, new_dst_file_name)
 
+def copy_image(
+    voc_export_images_dir: Path,
+    src_file: Path,
+    new_file_name: str,
+    link_mode: str = "copy",
+):
+    # Directly exported with the new name, i.e., without renaming a copy
+    export_file(src_file, voc_export_images_dir / new_file_name, link_mode)
 
-def rescale_copy_image(voc_export_images_dir: Path, src_file: Path, new_file_name: str):
-    image = cv.imread(str(src_file))
-    cropped_image = image[
-        FSOCO_IMPORT_BORDER_THICKNESS:-FSOCO_IMPORT_BORDER_THICKNESS,
-        FSOCO_IMPORT_BORDER_THICKNESS:-FSOCO_IMPORT_BORDER_THICKNESS,
-        :,
-    ]
 
+def rescale_copy_image(
+    voc_export_images_dir: Path,
+    src_file: Path,
+    new_file_name: str,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+):
     new_dst_file_name = voc_export_images_dir / new_file_name
-    cv.imwrite(str(new_dst_file_name), cropped_image)
+    crop_image_border(
+        src_file, new_dst_file_name, FSOCO_IMPORT_BORDER_THICKNESS, jpeg_quality
+    )
 
 
 def handle_image(
@@ -138,6 +157,8 @@ def handle_image(
     anns_dir: Path,
     project: Project,
     remove_watermark: bool,
+    jpeg_quality: int,
+    link_mode: str,
     item_name: str,
 ):
     img_path, ann_path = dataset.get_item_paths(item_name)
@@ -146,7 +167,12 @@ def handle_image(
     pascal_ann_path = os.path.join(anns_dir, no_ext_name + XML_EXT)
 
     export_image(
-        images_dir, Path(img_path), no_ext_name + OUT_IMG_EXT, remove_watermark
+        images_dir,
+        Path(img_path),
+        no_ext_name + OUT_IMG_EXT,
+        remove_watermark,
+        jpeg_quality,
+        link_mode,
     )
 
     ann = Annotation.load_json_file(ann_path, project_meta=project.meta)
@@ -182,10 +208,19 @@ def handle_image(
     return ann.img_tags, no_ext_name, len(ann.labels)
 
 
-def main(sly_project_path: str, output_path: str, remove_watermark: bool, merge: bool):
+def main(
+    sly_project_path: str,
+    output_path: str,
+    remove_watermark: bool,
+    merge: bool,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+    link_mode: str = "copy",
+):
     output_path = Path(output_path)
     if output_path.exists():
         shutil.rmtree(output_path)
 
     sly_project = Project(sly_project_path, OpenMode.READ)
-    iterate_project(output_path, sly_project, remove_watermark, merge)
+    iterate_project(
+        output_path, sly_project, remove_watermark, merge, jpeg_quality, link_mode
+    )
@@ -1,6 +1,7 @@
 import click
 
 from .sly2yolo import main
+from ..image_export import LINK_MODES
 
 
 @click.command()
@@ -8,7 +9,26 @@ from .sly2yolo import main
 @click.argument("output_folder", type=str)
 @click.option("--remove_watermark", is_flag=True, default=False)
 @click.option("--exclude", "-e", multiple=True)
-def sly2yolo(sly_project_folder, output_folder, remove_watermark, exclude):
+@click.option(
+    "--jpeg_quality",
+    type=click.IntRange(0, 100),
+    default=95,
+    help="JPEG quality of images that are encoded again to remove the watermark",
+)
+@click.option(
+    "--link_mode",
+    type=click.Choice(LINK_MODES),
+    default="copy",
+    help="How images are exported if the watermark is not removed",
+)
+def sly2yolo(
+    sly_project_folder,
+    output_folder,
+    remove_watermark,
+    exclude,
+    jpeg_quality,
+    link_mode,
+):
     """
     Supervisely  => Darknet YOLO format
 
@@ -21,6 +41,15 @@ def sly2yolo(sly_project_folder, output_folder, remove_watermark, exclude):
     \b
     Use --exclude tag_name or -e tag_name to exclude objects with the specific tag.
 
+    \b
+    With --remove_watermark, JPEGs are cropped losslessly if jpegtran is installed and the border is aligned
+    with the JPEG blocks. Otherwise, they are encoded again with --jpeg_quality.
+
+    \b
+    Use --link_mode hardlink/symlink/reflink to export the images without copying them if the watermark is kept.
+    Hard links and reflinks fall back to copying if the output folder is on a different file system.
+    Note that editing a hard linked or symlinked image also changes the original image.
+
     \b
     Input:
     project_name
@@ -51,7 +80,14 @@ def sly2yolo(sly_project_folder, output_folder, remove_watermark, exclude):
 
     """
     click.echo("[LOG] Running Supervisely to  Darknet Yolo label converter")
-    main(sly_project_folder, output_folder, remove_watermark, exclude)
+    main(
+        sly_project_folder,
+        output_folder,
+        remove_watermark,
+        exclude,
+        jpeg_quality,
+        link_mode,
+    )
 
 
 if __name__ == "__main__":
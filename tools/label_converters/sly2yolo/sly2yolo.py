@@ -1,15 +1,14 @@
 from pathlib import Path
 import json
 from collections import defaultdict
-import os
 import shutil
 import click
-import cv2 as cv
 from multiprocessing import Pool
 import tqdm
 from functools import partial
 
 from ..helpers import fsoco_to_class_id_mapping
+from ..image_export import DEFAULT_JPEG_QUALITY, crop_image_border, export_file
 from watermark.watermark import FSOCO_IMPORT_BORDER_THICKNESS
 
 
@@ -25,34 +24,37 @@ def export_image(
     src_file: Path,
     new_file_name: str,
     remove_watermark: bool,
+    jpeg_quality: int,
+    link_mode: str,
 ):
     if remove_watermark:
-        rescale_copy_image(darknet_export_images_dir, src_file, new_file_name)
+        rescale_copy_image(
+            darknet_export_images_dir, src_file, new_file_name, jpeg_quality
+        )
     else:
-        copy_image(darknet_export_images_dir, src_file, new_file_name)
-
+        copy_image(darknet_export_images_dir, src_file, new_file_name, link_mode)
 
-def copy_image(darknet_export_images_dir: Path, src_file: Path, new_file_name: str):
-    old_file_name = src_file.name
-    shutil.copy(src_file, darknet_export_images_dir)
 
-    dst_file = darknet_export_images_dir / old_file_name
-    new_dst_file_name = darknet_export_images_dir / new_file_name
-    os.rename(dst_file, new_dst_file_name)
+def copy_image(
+    darknet_export_images_dir: Path,
+    src_file: Path,
+    new_file_name: str,
+    link_mode: str = "copy",
+):
+    # Directly exported with the new name, i.e., without renaming a copy
+    export_file(src_file, darknet_export_images_dir / new_file_name, link_mode)
 
 
 def rescale_copy_image(
-    darknet_export_images_dir: Path, src_file: Path, new_file_name: str
+    darknet_export_images_dir: Path,
+    src_file: Path,
+    new_file_name: str,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
 ):
-    image = cv.imread(str(src_file))
-    cropped_image = image[
-        FSOCO_IMPORT_BORDER_THICKNESS:-FSOCO_IMPORT_BORDER_THICKNESS,
-        FSOCO_IMPORT_BORDER_THICKNESS:-FSOCO_IMPORT_BORDER_THICKNESS,
-        :,
-    ]
-
     new_dst_file_name = darknet_export_images_dir / new_file_name
-    cv.imwrite(str(new_dst_file_name), cropped_image)
+    crop_image_border(
+        src_file, new_dst_file_name, FSOCO_IMPORT_BORDER_THICKNESS, jpeg_quality
+    )
 
 
 def convert_object_entry(
@@ -170,6 +172,8 @@ def convert_label(
     class_id_mapping: dict,
     remove_watermark: bool,
     exclude_tags: list,
+    jpeg_quality: int,
+    link_mode: str,
     label: Path,
 ):
     class_counter = defaultdict(int)
@@ -184,7 +188,14 @@ def convert_label(
             image_width = data["size"]["width"]
             image_height = data["size"]["height"]
 
-            export_image(darknet_export_images_dir, image, name, remove_watermark)
+            export_image(
+                darknet_export_images_dir,
+                image,
+                name,
+                remove_watermark,
+                jpeg_quality,
+                link_mode,
+            )
             label_file_name = darknet_export_labels_dir / f"{name}.txt"
 
             with open(label_file_name, "w") as darknet_label:
@@ -232,7 +243,12 @@ def convert_label(
 
 
 def main(
-    sly_project_path: str, output_path: str, remove_watermark: bool, exclude: list
+    sly_project_path: str,
+    output_path: str,
+    remove_watermark: bool,
+    exclude: list,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+    link_mode: str = "copy",
 ):
     class_id_mapping = fsoco_to_class_id_mapping()
 
@@ -253,6 +269,8 @@ def main(
         class_id_mapping,
         remove_watermark,
         exclude,
+        jpeg_quality,
+        link_mode,
     )
 
     global_class_counter = defaultdict(int)
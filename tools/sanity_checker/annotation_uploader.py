@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Optional
+
+from .utils import safe_request
+
+# The batch size is adapted such that a single upload takes about this long
+TARGET_UPLOAD_LATENCY = 5.0  # seconds
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 500
+INITIAL_BATCH_SIZE = 50
+
+
+class AnnotationUploader:
+    """
+    Collects updated annotations and uploads them in batches via annotation.upload_jsons.
+    The upload of a batch runs in the background while the next images are being checked.
+    """
+
+    def __init__(self, sly_api, dry_run: bool = False):
+        self.sly_api = sly_api
+        self.dry_run = dry_run
+        self.batch_size = INITIAL_BATCH_SIZE
+
+        self.number_uploaded = 0
+        self.number_batches = 0
+
+        self._image_ids: List[int] = []
+        self._annotations: List[dict] = []
+        # At most one upload is in flight to preserve the order of updates
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_upload: Optional[Future] = None
+
+    def add(self, image_id: int, annotation_json: dict):
+        if self.dry_run:
+            return
+        self._image_ids.append(image_id)
+        self._annotations.append(annotation_json)
+        if len(self._image_ids) >= self.batch_size:
+            self._submit()
+
+    def flush(self):
+        if self._image_ids:
+            self._submit()
+        self._wait_for_pending_upload()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    def statistics(self) -> dict:
+        return {
+            "number_uploaded": self.number_uploaded,
+            "number_batches": self.number_batches,
+            "final_batch_size": self.batch_size,
+        }
+
+    def _submit(self):
+        self._wait_for_pending_upload()
+        image_ids, annotations = self._image_ids, self._annotations
+        self._image_ids, self._annotations = [], []
+        self._pending_upload = self._executor.submit(
+            self._upload, image_ids, annotations
+        )
+
+    def _wait_for_pending_upload(self):
+        if self._pending_upload is not None:
+            # Re-raises any exception of the upload, e.g., SystemExit from safe_request()
+            self._pending_upload.result()
+            self._pending_upload = None
+
+    def _upload(self, image_ids: List[int], annotations: List[dict]):
+        start_time = time.perf_counter()
+        safe_request(self.sly_api.annotation.upload_jsons, image_ids, annotations)
+        latency = time.perf_counter() - start_time
+
+        self.number_uploaded += len(image_ids)
+        self.number_batches += 1
+        self._adapt_batch_size(len(image_ids), latency)
+
+    def _adapt_batch_size(self, batch_size: int, latency: float):
+        # Only adapt if the batch was full, i.e., the latency is representative
+        if batch_size < self.batch_size:
+            return
+        if latency < TARGET_UPLOAD_LATENCY / 2:
+            self.batch_size = min(MAX_BATCH_SIZE, self.batch_size * 2)
+        elif latency > TARGET_UPLOAD_LATENCY:
+            self.batch_size = max(MIN_BATCH_SIZE, self.batch_size // 2)
@@ -1,8 +1,11 @@
+from typing import List, Optional, Dict, Any
+
 import numpy as np
 import supervisely_lib as sly
 
 from similarity_scorer.utils.logger import Logger
-from .label_checker import LabelChecker, check_label_existence
+from .check_registry import check_registry
+from .label_checker import LabelChecker
 
 
 class BoundingBoxChecker(LabelChecker):
@@ -10,174 +13,243 @@ class BoundingBoxChecker(LabelChecker):
         super().__init__(*args)
 
         # Used to check for redundant boxes
-        self.previous_labels = []
+        self.previous_labels = []  # (class, tags) of each checked box
+        self.previous_corner_points = np.empty((0, 4))
+
+        # The batched checks run on these objects. Deleted labels are set to None.
+        self.labels: List[Optional[Dict[str, Any]]] = []
 
     def run(self, label: dict):
-        if label["geometryType"] != "rectangle":
-            raise ValueError(
-                f"Wrong label type: {label['geometryType']}. Expected: rectangle."
-            )
+        return self.run_batch([label])
+
+    def run_batch(self, labels: List[dict]) -> bool:
+        # Runs all checks on all given labels at once, e.g., all rectangles of an image
+        for label in labels:
+            if label["geometryType"] != "rectangle":
+                raise ValueError(
+                    f"Wrong label type: {label['geometryType']}. Expected: rectangle."
+                )
         # Do not run the checker on labels tagged as "resolved"
-        if LabelChecker.is_resolved_tagged(label):
+        self.labels = [
+            label for label in labels if not LabelChecker.is_resolved_tagged(label)
+        ]
+        if not self.labels:
             return True
-        # Run all checks on the same label.
-        self.label = label
 
-        # Compute area of bounding box
-        corner_points = self.label["points"]["exterior"]
-        self.label["area"] = np.abs(corner_points[0][0] - corner_points[1][0]) * np.abs(
-            corner_points[0][1] - corner_points[1][1]
-        )
+        # Each row contains the corner points of a box: x_1, y_1, x_2, y_2
+        corner_points = np.array(
+            [label["points"]["exterior"] for label in self.labels]
+        ).reshape(-1, 4)
 
-        is_ok = True
-        is_ok &= not self._is_repeated_box(maximum_distance=2)
-        is_ok &= not self._is_small_label(minimum_area=20, delete_threshold_area=10)
-        is_ok &= not self._is_outside_image_frame(image_border_size=140)
-        is_ok &= not self._is_distorted_box(
-            minimum_ratio=0.5, maximum_ratio=3.0, skip_if_truncated=True
-        )
-        return is_ok
+        is_ok = np.ones(len(self.labels), dtype=bool)
+        for check in check_registry.get_enabled_checks("rectangle"):
+            is_ok &= ~check(self, corner_points)
+        return bool(np.all(is_ok))
 
-    @check_label_existence
-    def _is_repeated_box(self, maximum_distance: int = 0):
+    @check_registry.register("rectangle", "repeated_label", maximum_distance=2)
+    def _is_repeated_box(
+        self, corner_points: np.ndarray, maximum_distance: int = 0
+    ) -> np.ndarray:
         # This checks for redundant boxes:
         # - if the location, the class, and the tags are equal, the current label is removed
         # - if there are differences, add an issue tag
 
-        category = self.label["classTitle"]
-        tags = [tag["name"] for tag in self.label["tags"]]
-        corner_points = self.label["points"]["exterior"]
-
-        is_repeated_box = False
-        for previous_label in self.previous_labels:
-            if (
-                category == previous_label[0]
-                and tags == previous_label[1]
-                and corner_points == previous_label[2]
-            ):
-                # Remove the redundant label
-                if self.apply_auto_fixes:
-                    self._delete_label(self.label)
-                    log_text = (
-                        f"{self.image_name} | bounding box | repeated label --> removed"
-                    )
-                    Logger.log_info_alt(log_text)
-                else:
-                    is_repeated_box = True
-            elif (
-                np.abs(np.array(corner_points) - np.array(previous_label[2]))
-                <= maximum_distance
-            ).all():
-                # Add an issue tag
-                is_repeated_box = True
-        self.previous_labels.append((category, tags, corner_points))
-
-        self._update_issue_tag(self.label, "Repeated label", is_repeated_box)
-
-        if self.verbose and is_repeated_box:
-            log_text = f"{self.image_name} | bounding box | repeated label"
-            Logger.log_info_alt(log_text)
-        return is_repeated_box
-
-    @check_label_existence
-    def _is_small_label(self, minimum_area: int, delete_threshold_area: int = -1):
-        is_small_label = self.label["area"] < minimum_area
-        remove_label = (
-            self.label["area"] < delete_threshold_area and self.apply_auto_fixes
+        number_previous = len(self.previous_labels)
+        number_labels = len(self.labels)
+        descriptions = [
+            (label["classTitle"], [tag["name"] for tag in label["tags"]])
+            for label in self.labels
+        ]
+        all_descriptions = self.previous_labels + descriptions
+        all_corner_points = np.concatenate([self.previous_corner_points, corner_points])
+
+        # Largest coordinate difference of every new box to every box, computed in one shot
+        distances = np.abs(
+            corner_points[:, np.newaxis, :] - all_corner_points[np.newaxis, :, :]
+        ).max(axis=2)
+        # Each box is only compared to the boxes checked before it
+        is_checked_before = (
+            np.arange(len(all_corner_points))[np.newaxis, :]
+            < (number_previous + np.arange(number_labels))[:, np.newaxis]
         )
-
-        if remove_label:
-            self._delete_label(self.label)
-        else:
-            self._update_issue_tag(self.label, "Small label", is_small_label)
-
-        if self.verbose and is_small_label:
-            log_text = f'{self.image_name} | bounding box | small label ({self.label["area"]} < {minimum_area})'
-            log_text += " --> removed" if remove_label else ""
-            Logger.log_info_alt(log_text)
-        if remove_label:
-            is_small_label = False
-            self.label = None
-        return is_small_label
-
-    @check_label_existence
-    def _is_outside_image_frame(self, image_border_size: int):
+        is_close = (distances <= maximum_distance) & is_checked_before
+
+        is_repeated_box = np.zeros(number_labels, dtype=bool)
+        for i in np.flatnonzero(is_close.any(axis=1)):
+            label = self.labels[i]
+            for j in np.flatnonzero(is_close[i]):
+                if distances[i, j] == 0 and all_descriptions[j] == descriptions[i]:
+                    # Remove the redundant label
+                    if self.apply_auto_fixes:
+                        if self.labels[i] is not None:
+                            self._delete_label(label)
+                            self.labels[i] = None
+                            log_text = f"{self.image_name} | bounding box | repeated label --> removed"
+                            Logger.log_info_alt(log_text)
+                    else:
+                        is_repeated_box[i] = True
+                else:
+                    # Add an issue tag
+                    is_repeated_box[i] = True
+
+        self.previous_labels = all_descriptions
+        self.previous_corner_points = all_corner_points
+
+        for i, label in enumerate(self.labels):
+            if label is None:
+                continue
+            self._update_issue_tag(label, "Repeated label", is_repeated_box[i])
+
+            if self.verbose and is_repeated_box[i]:
+                log_text = f"{self.image_name} | bounding box | repeated label"
+                Logger.log_info_alt(log_text)
+        return is_repeated_box & self._label_exists()
+
+    @check_registry.register(
+        "rectangle", "small_label", minimum_area=20, delete_threshold_area=10
+    )
+    def _is_small_label(
+        self,
+        corner_points: np.ndarray,
+        minimum_area: int,
+        delete_threshold_area: int = -1,
+    ) -> np.ndarray:
+        areas = self._compute_areas(corner_points)
+        is_small_label = areas < minimum_area
+        remove_label = (areas < delete_threshold_area) & self.apply_auto_fixes
+
+        for i, label in enumerate(self.labels):
+            if label is None:
+                continue
+            if remove_label[i]:
+                self._delete_label(label)
+            else:
+                self._update_issue_tag(label, "Small label", is_small_label[i])
+
+            if self.verbose and is_small_label[i]:
+                log_text = f"{self.image_name} | bounding box | small label ({areas[i]} < {minimum_area})"
+                log_text += " --> removed" if remove_label[i] else ""
+                Logger.log_info_alt(log_text)
+            if remove_label[i]:
+                self.labels[i] = None
+        return is_small_label & self._label_exists()
+
+    @check_registry.register("rectangle", "outside_image_frame", image_border_size=140)
+    def _is_outside_image_frame(
+        self, corner_points: np.ndarray, image_border_size: int
+    ) -> np.ndarray:
         # Check if the label reaches into the black border (watermark)
 
-        corner_points = self.label["points"]["exterior"]
-        min_x = min(corner_points[0][0], corner_points[1][0])
-        max_x = max(corner_points[0][0], corner_points[1][0])
-        min_y = min(corner_points[0][1], corner_points[1][1])
-        max_y = max(corner_points[0][1], corner_points[1][1])
-
-        is_outside_image_frame = False
-        is_outside_image_frame |= min_x < image_border_size
-        is_outside_image_frame |= max_x > self.image_width - image_border_size
-        is_outside_image_frame |= min_y < image_border_size
-        is_outside_image_frame |= max_y > self.image_height - image_border_size
-
-        if not self.apply_auto_fixes:
-            self._update_issue_tag(
-                self.label, "Inside watermark", is_outside_image_frame
-            )
-        elif is_outside_image_frame:
-            # Crop bounding box to the main image
-            self.label["points"]["exterior"] = [
-                [max(min_x, image_border_size), max(min_y, image_border_size)],
-                [
-                    min(max_x, self.image_width - image_border_size),
-                    min(max_y, self.image_height - image_border_size),
-                ],
+        min_xy = np.minimum(corner_points[:, :2], corner_points[:, 2:])
+        max_xy = np.maximum(corner_points[:, :2], corner_points[:, 2:])
+        lower_bound = np.array([image_border_size, image_border_size])
+        upper_bound = np.array(
+            [
+                self.image_width - image_border_size,
+                self.image_height - image_border_size,
             ]
-            self._update_rectangle_data()
-            # Remove issue tag if it previously existed
-            self._delete_issue_tag(self.label, "Inside watermark")
-            # Increment fixed_issue counter
-            self._increment_fixed_issue_tag(self.label)
-
-        if self.verbose and is_outside_image_frame:
-            log_text = f"{self.image_name} | bounding box | inside watermark"
-            log_text += " --> fixed" if self.apply_auto_fixes else ""
-            Logger.log_info_alt(log_text)
-        if self.apply_auto_fixes:
-            is_outside_image_frame = False
-        return is_outside_image_frame
+        )
 
-    @check_label_existence
+        is_outside_image_frame = np.any(min_xy < lower_bound, axis=1) | np.any(
+            max_xy > upper_bound, axis=1
+        )
+        # Crop bounding boxes to the main image
+        cropped_min_xy = np.maximum(min_xy, lower_bound)
+        cropped_max_xy = np.minimum(max_xy, upper_bound)
+
+        for i, label in enumerate(self.labels):
+            if label is None:
+                continue
+            if not self.apply_auto_fixes:
+                self._update_issue_tag(
+                    label, "Inside watermark", is_outside_image_frame[i]
+                )
+            elif is_outside_image_frame[i]:
+                label["points"]["exterior"] = [
+                    cropped_min_xy[i].tolist(),
+                    cropped_max_xy[i].tolist(),
+                ]
+                self.labels[i] = label = self._update_rectangle_data(label)
+                corner_points[i] = np.concatenate(
+                    [cropped_min_xy[i], cropped_max_xy[i]]
+                )
+                # Remove issue tag if it previously existed
+                self._delete_issue_tag(label, "Inside watermark")
+                # Increment fixed_issue counter
+                self._increment_fixed_issue_tag(label)
+
+            if self.verbose and is_outside_image_frame[i]:
+                log_text = f"{self.image_name} | bounding box | inside watermark"
+                log_text += " --> fixed" if self.apply_auto_fixes else ""
+                Logger.log_info_alt(log_text)
+        if self.apply_auto_fixes:
+            is_outside_image_frame[:] = False
+        return is_outside_image_frame & self._label_exists()
+
+    @check_registry.register(
+        "rectangle",
+        "distorted_box",
+        minimum_ratio=0.5,
+        maximum_ratio=3.0,
+        skip_if_truncated=True,
+    )
     def _is_distorted_box(
-        self, minimum_ratio: float, maximum_ratio: float, skip_if_truncated: bool
-    ):
+        self,
+        corner_points: np.ndarray,
+        minimum_ratio: float,
+        maximum_ratio: float,
+        skip_if_truncated: bool,
+    ) -> np.ndarray:
         # maximum_ratio: height to width
         # The reason for a distorted box could be that the box covers multiple labels
 
-        if skip_if_truncated and self.is_tagged(self.label, "truncated"):
-            return False
-
-        corner_points = self.label["points"]["exterior"]
-        box_width = np.abs(corner_points[0][0] - corner_points[1][0])
-        box_height = np.abs(corner_points[0][1] - corner_points[1][1])
-        ratio = box_height / box_width
+        box_width = np.abs(corner_points[:, 0] - corner_points[:, 2])
+        box_height = np.abs(corner_points[:, 1] - corner_points[:, 3])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = box_height / box_width
         greater_max_ratio = ratio > maximum_ratio
         smaller_min_ratio = ratio < minimum_ratio
-        is_distorted_box = greater_max_ratio or smaller_min_ratio
-
-        self._update_issue_tag(self.label, "Suspicious aspect ratio", is_distorted_box)
-
-        if self.verbose and is_distorted_box:
-            log_text = f"{self.image_name} | bounding box | aspect ratio ({np.round(ratio, 1)} "
-            if greater_max_ratio:
-                log_text += f"> {maximum_ratio})"
-            elif smaller_min_ratio:
-                log_text += f"< {minimum_ratio})"
-            Logger.log_info_alt(log_text)
-        return is_distorted_box
-
-    def _update_rectangle_data(self):
-        updated_label = sly.Label.from_json(self.label, self.project_meta)
-        self._update_label(updated_label)
-        # Update label object for later checks
-        self.label = updated_label.to_json()
-        corner_points = self.label["points"]["exterior"]
-        self.label["area"] = np.abs(corner_points[0][0] - corner_points[1][0]) * np.abs(
-            corner_points[0][1] - corner_points[1][1]
+        is_distorted_box = greater_max_ratio | smaller_min_ratio
+
+        for i, label in enumerate(self.labels):
+            if label is None:
+                continue
+            if skip_if_truncated and self.is_tagged(label, "truncated"):
+                is_distorted_box[i] = False
+                continue
+
+            self._update_issue_tag(
+                label, "Suspicious aspect ratio", is_distorted_box[i]
+            )
+
+            if self.verbose and is_distorted_box[i]:
+                log_text = f"{self.image_name} | bounding box | aspect ratio ({np.round(ratio[i], 1)} "
+                if greater_max_ratio[i]:
+                    log_text += f"> {maximum_ratio})"
+                elif smaller_min_ratio[i]:
+                    log_text += f"< {minimum_ratio})"
+                Logger.log_info_alt(log_text)
+        return is_distorted_box & self._label_exists()
+
+    def _label_exists(self) -> np.ndarray:
+        # A previous check could have deleted a label. Thus, fallback to returning no issue.
+        return np.array([label is not None for label in self.labels], dtype=bool)
+
+    @staticmethod
+    def _compute_areas(corner_points: np.ndarray) -> np.ndarray:
+        return np.abs(corner_points[:, 0] - corner_points[:, 2]) * np.abs(
+            corner_points[:, 1] - corner_points[:, 3]
         )
+
+    def _update_rectangle_data(self, label: Dict[str, Any]) -> Dict[str, Any]:
+        # Replace the geometry of the label in the updated annotation but keep its tags,
+        #  e.g., issue tags added by previous checks of this run
+        for candidate_label in self.context.updated_annotation.labels:
+            if candidate_label.geometry.sly_id == label["id"]:
+                updated_label = candidate_label.clone(
+                    geometry=sly.Rectangle.from_json(label)
+                )
+                self._update_label(updated_label)
+                # Return updated label object for later checks
+                return updated_label.to_json()
+        return label
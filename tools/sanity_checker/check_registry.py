@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class Check:
+    def __init__(
+        self,
+        geometry_type: str,
+        name: str,
+        function: Callable,
+        parameters: Dict[str, Any],
+    ):
+        self.geometry_type = geometry_type
+        self.name = name
+        self.function = function
+        self.parameters = parameters
+        self.enabled = True
+
+        # Instrumentation
+        self.number_calls = 0
+        self.number_checked = 0  # A single call can check multiple labels
+        self.number_hits = 0
+        self.total_time = 0.0
+        # Images can be checked concurrently in threads
+        self._lock = threading.Lock()
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.geometry_type}.{self.name}"
+
+    def __call__(self, checker, *args):
+        start_time = time.perf_counter()
+        result = self.function(checker, *args, **self.parameters)
+        elapsed_time = time.perf_counter() - start_time
+        with self._lock:
+            self.total_time += elapsed_time
+            self.number_calls += 1
+            self.number_checked += int(np.size(result))
+            self.number_hits += int(np.sum(result))
+        return result
+
+    def reset_statistics(self):
+        self.number_calls = 0
+        self.number_checked = 0
+        self.number_hits = 0
+        self.total_time = 0.0
+
+    def add_statistics(self, statistics: Dict[str, Any]):
+        self.number_calls += statistics["number_calls"]
+        self.number_checked += statistics["number_checked"]
+        self.number_hits += statistics["number_hits"]
+        self.total_time += statistics["total_time"]
+
+    def statistics(self) -> Dict[str, Any]:
+        return {
+            "number_calls": self.number_calls,
+            "number_checked": self.number_checked,
+            "number_hits": self.number_hits,
+            "hit_rate": round(self.number_hits / max(self.number_checked, 1), 4),
+            "total_time": self.total_time,
+        }
+
+
+class CheckRegistry:
+    """
+    Checks register themselves with the geometry type they run on and their default parameters.
+    The checkers run all enabled checks of their geometry type in the order of registration.
+    """
+
+    def __init__(self):
+        self._checks: Dict[str, List[Check]] = defaultdict(list)
+
+    def register(self, geometry_type: str, name: str, **parameters):
+        def decorator(function: Callable):
+            if self.get_check(geometry_type, name) is not None:
+                raise ValueError(f"Check {geometry_type}.{name} is already registered.")
+            self._checks[geometry_type].append(
+                Check(geometry_type, name, function, parameters)
+            )
+            return function
+
+        return decorator
+
+    def get_check(self, geometry_type: str, name: str) -> Optional[Check]:
+        for check in self._checks.get(geometry_type, []):
+            if check.name == name:
+                return check
+        return None
+
+    def get_checks(self, geometry_type: Optional[str] = None) -> List[Check]:
+        if geometry_type is not None:
+            return list(self._checks.get(geometry_type, []))
+        return [check for checks in self._checks.values() for check in checks]
+
+    def get_enabled_checks(self, geometry_type: str) -> List[Check]:
+        return [check for check in self.get_checks(geometry_type) if check.enabled]
+
+    def configure(
+        self,
+        profile: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+        disabled_checks: Tuple[str, ...] = (),
+    ):
+        # The profile maps geometry type -> check name -> {"enabled": bool, <parameter>: <value>}
+        for geometry_type, check_configurations in (profile or {}).items():
+            for name, configuration in (check_configurations or {}).items():
+                check = self.get_check(geometry_type, name)
+                if check is None:
+                    raise ValueError(f"Unknown check: {geometry_type}.{name}")
+                configuration = dict(configuration or {})
+                check.enabled = bool(configuration.pop("enabled", True))
+                for parameter, value in configuration.items():
+                    if parameter not in check.parameters:
+                        raise ValueError(
+                            f"Unknown parameter of check {check.full_name}: {parameter}"
+                        )
+                    check.parameters[parameter] = value
+
+        # A check can be disabled by its full name, e.g., "bitmap.small_label", or for all geometry types by its name
+        for disabled_check in disabled_checks:
+            checks = [
+                check
+                for check in self.get_checks()
+                if disabled_check in (check.name, check.full_name)
+            ]
+            if not checks:
+                raise ValueError(f"Unknown check: {disabled_check}")
+            for check in checks:
+                check.enabled = False
+
+    def get_configuration(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        # The returned profile can be passed to configure(), e.g., in worker processes
+        configuration = defaultdict(dict)
+        for check in self.get_checks():
+            configuration[check.geometry_type][check.name] = {
+                "enabled": check.enabled,
+                **check.parameters,
+            }
+        return dict(configuration)
+
+    def reset_statistics(self):
+        for check in self.get_checks():
+            check.reset_statistics()
+
+    def add_statistics(self, statistics: Dict[str, Dict[str, Any]]):
+        for check in self.get_checks():
+            if check.full_name in statistics:
+                check.add_statistics(statistics[check.full_name])
+
+    def statistics(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            check.full_name: check.statistics()
+            for check in self.get_checks()
+            if check.enabled
+        }
+
+
+# All checkers register their checks here
+check_registry = CheckRegistry()
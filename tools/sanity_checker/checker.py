@@ -1,24 +1,31 @@
 from abc import ABC, abstractmethod
 
 
-class Checker(ABC):
-    # All implemented checkers share the same object as a single image could contain multiple issues
-    updated_annotation = None
-    is_annotation_updated = None
+class CheckContext:
+    # All checkers of an image share the same context as a single image could contain multiple issues.
+    #  Every image gets its own context, so multiple images can be checked concurrently.
+    def __init__(self, updated_annotation):
+        self.updated_annotation = updated_annotation
+        self.is_annotation_updated = False
+
+    def update_annotation(self, updated_annotation):
+        self.updated_annotation = updated_annotation
+        self.is_annotation_updated = True
 
+
+class Checker(ABC):
     def __init__(
         self,
         image_name: str,
-        updated_annotation,
+        context: CheckContext,
         apply_auto_fixes: bool,
         verbose: bool = False,
     ):
         super().__init__()
         self.image_name = image_name
+        self.context = context
         self.apply_auto_fixes = apply_auto_fixes
         self.verbose = verbose
-        Checker.updated_annotation = updated_annotation
-        Checker.is_annotation_updated = False
 
     @abstractmethod
     def run(self, *args, **kwargs) -> bool:
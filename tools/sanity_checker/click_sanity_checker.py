@@ -1,9 +1,12 @@
 import click
+import yaml
 from pathlib import Path
 from typing import Tuple
 
 from similarity_scorer.utils.logger import Logger
+from .check_registry import check_registry
 from .sanity_checker import SanityChecker
+from .offline_sanity_checker import OfflineSanityChecker
 
 
 @click.command()
@@ -11,15 +14,15 @@ from .sanity_checker import SanityChecker
     "--team_name",
     "-t",
     type=str,
-    required=True,
-    help="Specify the Supervisely team name.",
+    default=None,
+    help="Specify the Supervisely team name. Required unless --project_dir is used.",
 )
 @click.option(
     "--workspace_name",
     "-w",
     type=str,
-    required=True,
-    help="Specify the Supervisely workspace name.",
+    default=None,
+    help="Specify the Supervisely workspace name. Required unless --project_dir is used.",
 )
 @click.option(
     "--project_name",
@@ -38,8 +41,27 @@ from .sanity_checker import SanityChecker
     "--token",
     "server_token",
     type=str,
-    required=True,
-    help="Secret token to access Supervisely.",
+    default=None,
+    help="Secret token to access Supervisely. Required unless --project_dir is used.",
+)
+@click.option(
+    "--project_dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Run the checks offline on a local Supervisely project instead of the server.",
+)
+@click.option(
+    "--output_dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Offline mode only: write meta.json and all annotations to this folder instead of updating them in place."
+    + " Images are not copied.",
+)
+@click.option(
+    "--num_workers",
+    default=4,
+    help="Number of worker processes in offline mode or threads checking images otherwise.",
+    type=click.IntRange(1, 256),
 )
 @click.option(
     "--label_type",
@@ -56,10 +78,36 @@ from .sanity_checker import SanityChecker
     default=None,
     help="Save the results as 'sanity_checks.json' in the specified folder."
     + " If the path to a JSON file is given, this file will be used instead."
-    + " Any existing logs will be overwritten.",
+    + " Any existing logs will be overwritten."
+    + " The file contains 'version', 'jobs' with the statistics of each job,"
+    + " 'request_statistics', and 'check_statistics'.",
+)
+@click.option(
+    "--results_stream",
+    "results_stream_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Stream the issues, fixes, and check times of every image to this JSON Lines file while the checks run.",
 )
 @click.option(
-    "--dry_run", is_flag=True, help="Do not update the labels on Supervisely."
+    "--check_profile",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="YAML file to enable/disable checks and set their parameters, e.g.,"
+    + " 'rectangle: {outside_image_frame: {image_border_size: 140}, distorted_box: {enabled: false}}'.",
+)
+@click.option(
+    "--disable_check",
+    type=str,
+    multiple=True,
+    help="Disable a check by name, e.g., 'small_label' or 'bitmap.small_label'."
+    + " You can use this option multiple times. Use --list_checks to show all checks.",
+)
+@click.option("--list_checks", is_flag=True, help="List all available checks and exit.")
+@click.option(
+    "--dry_run",
+    is_flag=True,
+    help="Do not update the labels on Supervisely or in the local project.",
 )
 @click.option("--verbose", is_flag=True, help="Print all discovered issues.")
 def sanity_checker(
@@ -68,28 +116,70 @@ def sanity_checker(
     project_name: Tuple[str, ...],
     projects_whitelisted: bool,
     server_token: str,
+    project_dir: str,
+    output_dir: str,
+    num_workers: int,
     label_type: Tuple[str, ...],
     results_path: str,
+    results_stream_path: str,
+    check_profile: str,
+    disable_check: Tuple[str, ...],
+    list_checks: bool,
     dry_run: bool,
     verbose: bool,
 ):
     """
     The tools runs sanity checks on the labels on the Supervisely server.
     It supports both bounding boxes and instance segmentation.
+
+    \b
+    Use --project_dir to run the checks on a local Supervisely project instead.
     """
     server_address: str = "https://app.supervise.ly"
 
-    checker = SanityChecker(
-        server_address,
-        server_token,
-        team_name,
-        workspace_name,
-        project_name,
-        label_type,
-        projects_whitelisted,
-        dry_run,
-        verbose,
-    )
+    if list_checks:
+        for geometry_type, checks in check_registry.get_configuration().items():
+            for name, configuration in checks.items():
+                click.echo(f"{geometry_type}.{name}: {configuration}")
+        return
+
+    profile = None
+    if check_profile is not None:
+        with open(check_profile, "r") as f:
+            profile = yaml.safe_load(f)
+    try:
+        check_registry.configure(profile, disable_check)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    if project_dir is not None:
+        checker = OfflineSanityChecker(
+            project_dir,
+            label_type,
+            output_dir,
+            num_workers,
+            dry_run,
+            verbose,
+            results_stream_path,
+        )
+    else:
+        if team_name is None or workspace_name is None or server_token is None:
+            raise click.UsageError(
+                "Missing option: --team_name, --workspace_name, and --token are required unless --project_dir is used."
+            )
+        checker = SanityChecker(
+            server_address,
+            server_token,
+            team_name,
+            workspace_name,
+            project_name,
+            label_type,
+            projects_whitelisted,
+            dry_run,
+            verbose,
+            num_workers,
+            results_stream_path,
+        )
     checker.run()
     Logger.log_info("Sanity checks finished with the following results.")
     print(checker)
@@ -1,7 +1,8 @@
 from typing import List
 
 from similarity_scorer.utils.logger import Logger
-from .checker import Checker
+from .check_registry import check_registry
+from .checker import Checker, CheckContext
 
 
 class ImageChecker(Checker):
@@ -14,22 +15,24 @@ class ImageChecker(Checker):
     def __init__(
         self,
         image_name: str,
-        updated_annotation,
+        context: CheckContext,
         apply_auto_fixes: bool,
         verbose: bool = False,
     ):
-        super().__init__(image_name, updated_annotation, apply_auto_fixes, verbose)
+        super().__init__(image_name, context, apply_auto_fixes, verbose)
 
     def run(self) -> bool:  # pylint: disable=arguments-differ
         is_ok = True
-        is_ok &= self._is_wrongly_tagged(ImageChecker.ILLEGAL_TAGS)
+        for check in check_registry.get_enabled_checks("image"):
+            is_ok &= not check(self)
         return is_ok
 
+    @check_registry.register("image", "wrongly_tagged", illegal_tags=ILLEGAL_TAGS)
     def _is_wrongly_tagged(self, illegal_tags: List[str]) -> bool:
         is_wrongly_tagged = False
 
         wrong_tags: List[str] = []
-        for tag in Checker.updated_annotation.img_tags:
+        for tag in self.context.updated_annotation.img_tags:
             if tag.name in illegal_tags:
                 is_wrongly_tagged = True
                 wrong_tags.append(tag.name)
@@ -42,9 +45,8 @@ class ImageChecker(Checker):
             log_text += " --> fixed" if self.apply_auto_fixes else ""
             Logger.log_info_alt(log_text)
         if self.apply_auto_fixes and is_wrongly_tagged:
-            Checker.updated_annotation = Checker.updated_annotation.delete_tags_by_name(
-                wrong_tags
+            self.context.update_annotation(
+                self.context.updated_annotation.delete_tags_by_name(wrong_tags)
             )
-            Checker.is_annotation_updated = True
             is_wrongly_tagged = False
         return is_wrongly_tagged
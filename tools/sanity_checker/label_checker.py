@@ -5,7 +5,7 @@ import functools
 import supervisely_lib as sly
 from supervisely_lib.annotation.tag_collection import TagCollection
 
-from .checker import Checker
+from .checker import Checker, CheckContext
 
 
 # ToDo: This is how it should be done if the API would support it
@@ -48,11 +48,11 @@ class LabelChecker(Checker):
         image_height: int,
         image_width: int,
         project_meta,
-        updated_annotation,
+        context: CheckContext,
         apply_auto_fixes: bool,
         verbose: bool = False,
     ):
-        super().__init__(image_name, updated_annotation, apply_auto_fixes, verbose)
+        super().__init__(image_name, context, apply_auto_fixes, verbose)
         self.project_meta = project_meta
 
         # We use these numbers to check for labels reaching into the watermark
@@ -66,59 +66,65 @@ class LabelChecker(Checker):
     def run(self, label: Dict[str, Any]) -> bool:  # pylint: disable=arguments-differ
         raise NotImplementedError
 
-    @staticmethod
-    def _delete_label(label: Dict[str, Any]):
+    def _delete_label(self, label: Dict[str, Any]):
         # Search for this label in the updated_annotations object
-        for candidate_label in Checker.updated_annotation.labels:
+        for candidate_label in self.context.updated_annotation.labels:
             if candidate_label.geometry.sly_id == label["id"]:
-                Checker.updated_annotation = Checker.updated_annotation.delete_label(
-                    candidate_label
+                self.context.update_annotation(
+                    self.context.updated_annotation.delete_label(candidate_label)
                 )
-                Checker.is_annotation_updated = True
                 break
 
-    @staticmethod
-    def _update_label(updated_label):
+    def _update_label(self, updated_label):
         # Search for this label in the updated_annotations object
-        for candidate_label in Checker.updated_annotation.labels:
+        for candidate_label in self.context.updated_annotation.labels:
             if candidate_label.geometry.sly_id == updated_label.geometry.sly_id:
-                Checker.updated_annotation = Checker.updated_annotation.delete_label(
-                    candidate_label
-                ).add_label(updated_label)
-                Checker.is_annotation_updated = True
+                self.context.update_annotation(
+                    self.context.updated_annotation.delete_label(
+                        candidate_label
+                    ).add_label(updated_label)
+                )
                 break
 
-    @staticmethod
-    def _update_issue_tag(label: Dict[str, Any], tag_text: str, found_issue: bool):
+    def _update_issue_tag(
+        self, label: Dict[str, Any], tag_text: str, found_issue: bool
+    ):
         if found_issue:
-            LabelChecker._add_issue_tag(label, tag_text)
+            self._add_issue_tag(label, tag_text)
         else:
-            LabelChecker._delete_issue_tag(label, tag_text)
+            self._delete_issue_tag(label, tag_text)
 
-    @staticmethod
-    def _add_issue_tag(label: Dict[str, Any], tag_text: str):
+    def _add_issue_tag(self, label: Dict[str, Any], tag_text: str):
         # Do not tag multiple times
         if LabelChecker.is_issue_tagged(label, tag_text):
             return
 
         # Search for this label in the updated_annotations object
-        for candidate_label in Checker.updated_annotation.labels:
+        for candidate_label in self.context.updated_annotation.labels:
             if candidate_label.geometry.sly_id == label["id"]:
                 updated_label = candidate_label.add_tag(
                     sly.Tag(meta=LabelChecker.issue_tag_meta, value=tag_text)
                 )
-                Checker.updated_annotation = Checker.updated_annotation.delete_label(
-                    candidate_label
-                ).add_label(updated_label)
-                Checker.is_annotation_updated = True
+                self.context.update_annotation(
+                    self.context.updated_annotation.delete_label(
+                        candidate_label
+                    ).add_label(updated_label)
+                )
                 break
 
-    @staticmethod
-    def _increment_fixed_issue_tag(label: Dict[str, Any]):
+    def _increment_fixed_issue_tag(self, label: Dict[str, Any]):
         # Search for this label in the updated_annotations object
-        for candidate_label in Checker.updated_annotation.labels:
+        for candidate_label in self.context.updated_annotation.labels:
             if candidate_label.geometry.sly_id == label["id"]:
-                counter = LabelChecker.get_fixed_issue_tag_value(label)
+                # Read the counter from the updated label as multiple fixes can be applied to the same label
+                counter = next(
+                    (
+                        tag.value
+                        for tag in candidate_label.tags.items()
+                        if tag.name == LabelChecker.fixed_issue_tag_meta.name
+                    ),
+                    0,
+                )
                 updated_label = label_delete_tag(
                     candidate_label,
                     sly.Tag(meta=LabelChecker.fixed_issue_tag_meta, value=counter),
@@ -126,28 +132,29 @@ class LabelChecker(Checker):
                 updated_label = updated_label.add_tag(
                     sly.Tag(meta=LabelChecker.fixed_issue_tag_meta, value=counter + 1)
                 )
-                Checker.updated_annotation = Checker.updated_annotation.delete_label(
-                    candidate_label
-                ).add_label(updated_label)
-                Checker.is_annotation_updated = True
+                self.context.update_annotation(
+                    self.context.updated_annotation.delete_label(
+                        candidate_label
+                    ).add_label(updated_label)
+                )
                 break
 
-    @staticmethod
-    def _delete_issue_tag(label: Dict[str, Any], tag_text: str):
+    def _delete_issue_tag(self, label: Dict[str, Any], tag_text: str):
         if not LabelChecker.is_issue_tagged(label, tag_text):
             return
 
         # Search for this label in the updated_annotations object
-        for candidate_label in Checker.updated_annotation.labels:
+        for candidate_label in self.context.updated_annotation.labels:
             if candidate_label.geometry.sly_id == label["id"]:
                 updated_label = label_delete_tag(
                     candidate_label,
                     sly.Tag(meta=LabelChecker.issue_tag_meta, value=tag_text),
                 )
-                Checker.updated_annotation = Checker.updated_annotation.delete_label(
-                    candidate_label
-                ).add_label(updated_label)
-                Checker.is_annotation_updated = True
+                self.context.update_annotation(
+                    self.context.updated_annotation.delete_label(
+                        candidate_label
+                    ).add_label(updated_label)
+                )
                 break
 
     @staticmethod
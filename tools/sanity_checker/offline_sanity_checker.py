@@ -0,0 +1,207 @@
+import json
+import multiprocessing as mp
+import shutil
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import supervisely_lib as sly
+from tqdm import tqdm
+
+from similarity_scorer.utils.logger import Logger
+from .check_registry import check_registry
+from .results_stream import collect_label_findings
+from .sanity_checker import (
+    SanityChecker,
+    add_checker_tag_metas,
+    check_image,
+    count_label_statistics,
+)
+
+# will be initialized in every pool process!
+process_project_meta = None
+process_label_types_to_check: Tuple[str, ...] = ()
+process_apply_auto_fixes = False
+process_verbose = False
+process_in_place = False
+
+
+def _pool_process_init(
+    project_meta_json: dict,
+    label_types_to_check: Tuple[str, ...],
+    apply_auto_fixes: bool,
+    verbose: bool,
+    check_configuration: dict,
+    in_place: bool,
+):
+    global process_project_meta, process_label_types_to_check, process_apply_auto_fixes, process_verbose, process_in_place
+    check_registry.configure(check_configuration)
+    process_project_meta = sly.ProjectMeta.from_json(project_meta_json)
+    process_label_types_to_check = label_types_to_check
+    process_apply_auto_fixes = apply_auto_fixes
+    process_verbose = verbose
+    process_in_place = in_place
+
+
+def _check_annotation_file(task: Tuple[str, str, Optional[str]]):
+    image_name, ann_path, output_ann_path = task
+
+    with open(ann_path) as json_file:
+        annotation_json = json.load(json_file)
+
+    # The statistics of this image are merged in the main process
+    check_registry.reset_statistics()
+
+    start_time = time.perf_counter()
+    updated_annotation, is_annotation_updated = check_image(
+        image_name,
+        annotation_json,
+        process_project_meta,
+        process_label_types_to_check,
+        process_apply_auto_fixes,
+        process_verbose,
+    )
+    check_time = time.perf_counter() - start_time
+    # Only serialize the annotation if it has been updated.
+    #  Otherwise, the original JSON contains the same tags.
+    if is_annotation_updated:
+        annotation_json = updated_annotation.to_json()
+
+    # In a dry run, the output path is not set
+    if output_ann_path is not None:
+        if is_annotation_updated:
+            with open(output_ann_path, "w") as json_file:
+                json.dump(annotation_json, json_file)
+        elif not process_in_place:
+            shutil.copyfile(ann_path, output_ann_path)
+
+    return (
+        count_label_statistics(annotation_json),
+        is_annotation_updated,
+        check_registry.statistics(),
+        check_time,
+        # Only needed for the results stream, but cheap compared to the checks
+        collect_label_findings(annotation_json),
+    )
+
+
+class OfflineSanityChecker(SanityChecker):
+    """
+    Runs the same checks as the SanityChecker on a local Supervisely project, e.g., one downloaded for collect-stats.
+    Updated annotations are written in place or to the ann folders in the output directory.
+    """
+
+    def __init__(
+        self,
+        project_dir: str,
+        label_type: Tuple[str, ...],
+        output_dir: Optional[str] = None,
+        num_workers: int = 4,
+        dry_run: bool = False,
+        verbose: bool = False,
+        results_stream_path: Optional[str] = None,
+    ):  # pylint: disable=super-init-not-called
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.label_types_to_check = label_type
+        self.num_workers = num_workers
+        self.results_stream_path = results_stream_path
+        self.annotation_uploader = None
+        self.results_stream = None
+        self.job_statistics = {}  # The key is a pseudo-job name
+        self.number_updated_annotations = 0
+
+        if self.dry_run:
+            Logger.log_warn("This is a DRYRUN, i.e., annotations will not be written.")
+        if self.verbose:
+            Logger.log_warn(
+                "Verbose mode activated, i.e., all discovered issues will be printed."
+            )
+
+        self.project = sly.Project(project_dir, sly.OpenMode.READ)
+        Logger.log_info(f"Project: {self.project.name}, path={self.project.directory}")
+        self.output_dir = Path(output_dir if output_dir is not None else project_dir)
+        # Comparing the paths directly fails for relative paths, e.g., "./project" vs. "project"
+        self.in_place = (
+            self.output_dir.resolve() == Path(self.project.directory).resolve()
+        )
+
+        self.project_meta, self.is_project_meta_updated = add_checker_tag_metas(
+            self.project.meta
+        )
+
+    def run(self):
+        if not self.dry_run:
+            self._write_project_meta()
+
+        self._open_results_stream()
+        try:
+            for dataset in self.project:
+                self._run_local_dataset(dataset)
+        finally:
+            self._close_results_stream()
+
+    def run_statistics(self) -> dict:
+        return {"number_updated_annotations": self.number_updated_annotations}
+
+    def _write_project_meta(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.is_project_meta_updated or not self.in_place:
+            with open(self.output_dir / "meta.json", "w") as json_file:
+                json.dump(self.project_meta.to_json(), json_file)
+
+    def _run_local_dataset(self, dataset):
+        output_ann_dir = self.output_dir / dataset.name / "ann"
+        if not self.dry_run:
+            output_ann_dir.mkdir(parents=True, exist_ok=True)
+
+        tasks = []
+        for item_name in dataset:
+            _, ann_path = dataset.get_item_paths(item_name)
+            output_ann_path = (
+                str(output_ann_dir / Path(ann_path).name) if not self.dry_run else None
+            )
+            tasks.append((item_name, ann_path, output_ann_path))
+
+        with tqdm(
+            total=len(tasks),
+            desc=f"Processing dataset: {self.project.name} - {dataset.name}",
+        ) as pbar:
+            with mp.Pool(
+                self.num_workers,
+                initializer=_pool_process_init,
+                initargs=(
+                    self.project_meta.to_json(),
+                    self.label_types_to_check,
+                    not self.dry_run,
+                    self.verbose,
+                    check_registry.get_configuration(),
+                    self.in_place,
+                ),
+            ) as pool:
+                for (
+                    label_statistics,
+                    is_annotation_updated,
+                    check_statistics,
+                    check_time,
+                    findings,
+                ), (image_name, _, _) in zip(
+                    pool.imap(_check_annotation_file, tasks, chunksize=16), tasks
+                ):
+                    self.number_updated_annotations += int(is_annotation_updated)
+                    check_registry.add_statistics(check_statistics)
+                    for geometry_type, statistics in label_statistics.items():
+                        self._found_labels_in_jobless_image(
+                            self.project.name, dataset.name, geometry_type, statistics
+                        )
+                    if self.results_stream is not None:
+                        self.results_stream.write_image(
+                            self.project.name,
+                            dataset.name,
+                            image_name,
+                            label_statistics,
+                            findings,
+                            is_annotation_updated,
+                            check_time,
+                        )
+                    pbar.update(1)
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from similarity_scorer.utils.logger import Logger
+from .label_checker import LabelChecker
+
+
+def collect_label_findings(annotation_json: dict) -> List[Dict[str, Any]]:
+    # Issues and fixes of the labels in this image. Labels without any are skipped.
+    findings = []
+    for label in annotation_json["objects"]:
+        issues = [
+            tag["value"]
+            for tag in label["tags"]
+            if tag["name"] == LabelChecker.issue_tag_meta.name and "value" in tag
+        ]
+        number_fixed = LabelChecker.get_fixed_issue_tag_value(label)
+        if not issues and not number_fixed:
+            continue
+        findings.append(
+            {
+                "id": label.get("id"),
+                "geometry_type": label["geometryType"],
+                "class": label["classTitle"],
+                "issues": issues,
+                "number_fixed": number_fixed,
+                "resolved": LabelChecker.is_resolved_tagged(label),
+            }
+        )
+    return findings
+
+
+class ResultsStream:
+    """
+    Writes one JSON line per checked image while the sanity checker is running.
+    The file can be tailed during the run and remains usable if the run is interrupted.
+    A final line of type "summary" is written when the stream is closed.
+    """
+
+    def __init__(self, filename: Path):
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        # Line buffered, i.e., every image is flushed to disk immediately
+        self._file = open(self.filename, "w", buffering=1)
+        self.number_images = 0
+        Logger.log_info(f"Streaming results to file: {self.filename.absolute()}")
+
+    def write_image(
+        self,
+        project_name: str,
+        dataset_name: str,
+        image_name: str,
+        label_statistics: Dict[str, Dict[str, int]],
+        findings: List[Dict[str, Any]],
+        is_annotation_updated: bool,
+        check_time: float,
+        job_names: Optional[List[str]] = None,
+    ):
+        self._write(
+            {
+                "type": "image",
+                "project": project_name,
+                "dataset": dataset_name,
+                "image": image_name,
+                "jobs": job_names or [],
+                "is_updated": is_annotation_updated,
+                "check_time": round(check_time, 6),
+                "labels": label_statistics,
+                "findings": findings,
+            }
+        )
+        self.number_images += 1
+
+    def close(self, summary: Optional[Dict[str, Any]] = None):
+        if self._file.closed:
+            return
+        self._write(
+            {"type": "summary", "number_images": self.number_images, **(summary or {})}
+        )
+        self._file.close()
+
+    def _write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record) + "\n")
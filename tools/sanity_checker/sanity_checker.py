@@ -1,5 +1,8 @@
 import sys
-from typing import Union, Tuple, List
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Tuple, List, Dict, Optional
 from pathlib import Path
 import json
 
@@ -8,11 +11,120 @@ from tqdm import tqdm
 
 from similarity_scorer.utils.logger import Logger
 from .bounding_box_checker import BoundingBoxChecker
-from .checker import Checker
+from .check_registry import check_registry
+from .checker import CheckContext
 from .image_checker import ImageChecker
 from .label_checker import LabelChecker
 from .segmentation_checker import SegmentationChecker
-from .utils import safe_request, extract_geometry_type_from_job_name
+from .annotation_uploader import AnnotationUploader
+from .results_stream import ResultsStream, collect_label_findings
+from .utils import (
+    safe_request,
+    extract_geometry_type_from_job_name,
+    iterate_image_pages,
+    request_statistics,
+)
+
+# Number of parallel requests to query the labeling jobs during initialization
+NUMBER_REQUEST_THREADS = 8
+# Increment if the format of the results file changes.
+#  Version 1 had no version field and stored the statistics of each job at the top level.
+RESULTS_VERSION = 2
+
+
+def add_checker_tag_metas(project_meta):
+    # Add the tags used by the checkers if they do not exist yet
+    is_project_meta_updated = False
+    for tag_meta in [
+        LabelChecker.issue_tag_meta,
+        LabelChecker.resolved_tag_meta,
+        LabelChecker.fixed_issue_tag_meta,
+    ]:
+        if project_meta.get_tag_meta(tag_meta.name) is None:
+            project_meta = project_meta.add_tag_meta(tag_meta)
+            is_project_meta_updated = True
+    return project_meta, is_project_meta_updated
+
+
+def check_image(
+    image_name: str,
+    annotation_json: dict,
+    project_meta,
+    label_types_to_check: Tuple[str, ...],
+    apply_auto_fixes: bool,
+    verbose: bool = False,
+):
+    # We use this object to update the labels. All checkers of this image share the same instance.
+    context = CheckContext(sly.Annotation.from_json(annotation_json, project_meta))
+    image_checker = ImageChecker(
+        image_name,
+        context,
+        apply_auto_fixes,
+        verbose,
+    )
+    bounding_box_checker = BoundingBoxChecker(
+        image_name,
+        annotation_json["size"]["height"],
+        annotation_json["size"]["width"],
+        project_meta,
+        context,
+        apply_auto_fixes,
+        verbose,
+    )
+    segmentation_checker = SegmentationChecker(
+        image_name,
+        annotation_json["size"]["height"],
+        annotation_json["size"]["width"],
+        project_meta,
+        context,
+        apply_auto_fixes,
+        verbose,
+    )
+
+    # Run image-level checks
+    image_checker.run()
+
+    # Iterate over labels in current image
+    rectangle_labels = []
+    for label in annotation_json["objects"]:
+        if not label["geometryType"] in label_types_to_check:
+            continue
+        # We do not convert to a SLY object since it is easier to operate with the JSON dictionary
+        if label["geometryType"] == "rectangle":
+            rectangle_labels.append(label)
+        elif label["geometryType"] == "bitmap":
+            segmentation_checker.run(label)
+        else:
+            Logger.log_warn(f"Found unsupported geometry type: {label['geometryType']}")
+    # Bounding boxes are checked all at once to vectorize the checks
+    bounding_box_checker.run_batch(rectangle_labels)
+
+    # One of the checkers changed the annotation (image tags or labels)
+    return context.updated_annotation, context.is_annotation_updated
+
+
+def count_label_statistics(annotation_json: dict) -> Dict[str, Dict[str, int]]:
+    # Count number of issues and labels in this image. The key is the geometry type.
+    label_statistics = {}
+    for label in annotation_json["objects"]:
+        if "unknown" in label["classTitle"]:
+            continue
+        if label["geometryType"] not in ["rectangle", "bitmap"]:
+            continue
+        if label["geometryType"] not in label_statistics:
+            label_statistics[label["geometryType"]] = {
+                "number_labels": 0,
+                "number_issues": 0,
+                "number_fixed": 0,
+            }
+        found_issue = LabelChecker.is_issue_tagged(
+            label
+        ) and not LabelChecker.is_resolved_tagged(label)
+        statistics = label_statistics[label["geometryType"]]
+        statistics["number_labels"] += 1
+        statistics["number_issues"] += int(found_issue)
+        statistics["number_fixed"] += LabelChecker.get_fixed_issue_tag_value(label)
+    return label_statistics
 
 
 class SanityChecker:
@@ -27,17 +139,26 @@ class SanityChecker:
         projects_whitelisted: bool = True,
         dry_run: bool = False,
         verbose: bool = False,
+        num_workers: int = 4,
+        results_stream_path: Optional[str] = None,
     ):
         self.dry_run = dry_run
         self.verbose = verbose
         self.label_types_to_check = label_type
+        self.num_workers = num_workers
+        self.results_stream_path = results_stream_path
         self.sly_api = None
+        self.annotation_uploader = None
+        self.check_executor = None
+        self.results_stream = None
         self.sly_team = None
         self.sly_workspace = None
         self.sly_projects = []
         self.sly_project_metas = {}  # The key is the respective project name
         self.datasets = {}  # The key is the respective project name
         self.jobs = []
+        # The key is an image name, the value contains the names of all jobs the image is assigned to
+        self.image_job_names = defaultdict(list)
         self.job_statistics = (
             {}
         )  # The key is the respective job name or a pseudo-job name
@@ -97,15 +218,99 @@ class SanityChecker:
             + f" | fixed = {total_fixed.rjust(fixed_just)}\n"
         )
         string += "-" * max_length_line
+        run_statistics = self.run_statistics()
+        if run_statistics:
+            string += "\n" + " | ".join(
+                f"{key} = {value}" for key, value in run_statistics.items()
+            )
+        string += "\n" + self._check_statistics_to_string()
         return string
 
+    @staticmethod
+    def _check_statistics_to_string() -> str:
+        check_statistics = check_registry.statistics()
+        if not check_statistics:
+            return ""
+        max_length_check_name = max(len(name) for name in check_statistics)
+        string = ""
+        for name, statistics in sorted(
+            check_statistics.items(), key=lambda item: -item[1]["total_time"]
+        ):
+            string += (
+                f"{name.ljust(max_length_check_name)}"
+                + f" | time = {statistics['total_time']:9.3f}s"
+                + f" | calls = {statistics['number_calls']:7d}"
+                + f" | hits = {statistics['number_hits']:6d}"
+                + f" ({100 * statistics['hit_rate']:5.1f}%)\n"
+            )
+        return string.rstrip("\n")
+
     def run(self):
-        for project in self.sly_projects:
-            self._run_project(project, self.sly_project_metas[project.name])
+        self.annotation_uploader = AnnotationUploader(self.sly_api, self.dry_run)
+        # NumPy and SciPy release the GIL for most of the mask operations
+        self.check_executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        self._open_results_stream()
+        try:
+            for project in self.sly_projects:
+                self._run_project(project, self.sly_project_metas[project.name])
+        finally:
+            self.check_executor.shutdown()
+            self.annotation_uploader.close()
+            self._close_results_stream()
+
+    def run_statistics(self) -> dict:
+        run_statistics = request_statistics.to_dict()
+        if self.annotation_uploader is not None:
+            run_statistics.update(self.annotation_uploader.statistics())
+        return run_statistics
+
+    def _open_results_stream(self):
+        if self.results_stream_path is not None:
+            self.results_stream = ResultsStream(self.results_stream_path)
+
+    def _close_results_stream(self):
+        if self.results_stream is not None:
+            self.results_stream.close(
+                {
+                    "run_statistics": self.run_statistics(),
+                    "check_statistics": check_registry.statistics(),
+                }
+            )
+
+    def _stream_image_results(
+        self,
+        project_name: str,
+        dataset_name: str,
+        image_name: str,
+        annotation_json: dict,
+        label_statistics: Dict[str, Dict[str, int]],
+        is_annotation_updated: bool,
+        check_time: float,
+        job_names: List[str],
+    ):
+        if self.results_stream is None:
+            return
+        self.results_stream.write_image(
+            project_name,
+            dataset_name,
+            image_name,
+            label_statistics,
+            collect_label_findings(annotation_json),
+            is_annotation_updated,
+            check_time,
+            job_names,
+        )
 
     def save_results(self, filename: Path):
+        # Nested so that job names cannot collide with the statistics of the run
+        results = {
+            "version": RESULTS_VERSION,
+            "jobs": self.job_statistics,
+            "request_statistics": self.run_statistics(),
+            "check_statistics": check_registry.statistics(),
+        }
         with open(filename, "w") as f:
-            json.dump(self.job_statistics, f, indent=2)
+            json.dump(results, f, indent=2)
         Logger.log_info(f"Saved results to file: {filename.absolute()}")
 
     def _initialize_supervisely(
@@ -178,31 +383,10 @@ class SanityChecker:
                 project_meta_json
             )
 
-            update_project_meta = False
-            # Add "issue" tag if it does not exist yet
-            if LabelChecker.issue_tag_meta.name not in [
-                tag["name"] for tag in project_meta_json["tags"]
-            ]:
-                self.sly_project_metas[sly_project.name] = self.sly_project_metas[
-                    sly_project.name
-                ].add_tag_meta(LabelChecker.issue_tag_meta)
-                update_project_meta = True
-            # Add "resolved" tag if it does not exist yet
-            if LabelChecker.resolved_tag_meta.name not in [
-                tag["name"] for tag in project_meta_json["tags"]
-            ]:
-                self.sly_project_metas[sly_project.name] = self.sly_project_metas[
-                    sly_project.name
-                ].add_tag_meta(LabelChecker.resolved_tag_meta)
-                update_project_meta = True
-            # Add "fixed_issue" tag if it does not exist yet
-            if LabelChecker.fixed_issue_tag_meta.name not in [
-                tag["name"] for tag in project_meta_json["tags"]
-            ]:
-                self.sly_project_metas[sly_project.name] = self.sly_project_metas[
-                    sly_project.name
-                ].add_tag_meta(LabelChecker.fixed_issue_tag_meta)
-                update_project_meta = True
+            (
+                self.sly_project_metas[sly_project.name],
+                update_project_meta,
+            ) = add_checker_tag_metas(self.sly_project_metas[sly_project.name])
             if update_project_meta:
                 safe_request(
                     self.sly_api.project.update_meta,
@@ -220,21 +404,37 @@ class SanityChecker:
         # We have to query the jobs twice since the Supervisely API does not provide the entities (assigned images) in
         #  the first API call "get_list()"
         # Fun fact: the functionality has only been added due to our feature request and broke their repo multiple times
-        jobs = []
-        for project in self.sly_projects:
-            for dataset in self.datasets[project.name]:
-                jobs += safe_request(
+        # The requests are independent, so they are sent concurrently
+        datasets = [
+            dataset
+            for project in self.sly_projects
+            for dataset in self.datasets[project.name]
+        ]
+        with ThreadPoolExecutor(max_workers=NUMBER_REQUEST_THREADS) as executor:
+            jobs = []
+            for dataset_jobs in executor.map(
+                lambda dataset: safe_request(
                     self.sly_api.labeling_job.get_list,
                     self.sly_team.id,
                     dataset_id=dataset.id,
+                ),
+                datasets,
+            ):
+                jobs += dataset_jobs
+
+            for job in jobs:
+                Logger.log_info(f"Job: id={job.id}, name={job.name}")
+            # Query assigned images
+            self.jobs = list(
+                executor.map(
+                    lambda job: safe_request(
+                        self.sly_api.labeling_job.get_info_by_id, job.id
+                    ),
+                    jobs,
                 )
+            )
 
-        for job in jobs:
-            Logger.log_info(f"Job: id={job.id}, name={job.name}")
-            self.jobs.append(
-                safe_request(self.sly_api.labeling_job.get_info_by_id, job.id)
-            )  # Query assigned images
-
+        for job in self.jobs:
             # ToDo: Workaround because the API does not fill out the field 'classes_to_label'
             geometry_type = extract_geometry_type_from_job_name(job.name)
 
@@ -244,183 +444,125 @@ class SanityChecker:
                 "number_issues": 0,
                 "number_fixed": 0,
             }
+            for job_image in job.entities:
+                self.image_job_names[job_image["name"]].append(job.name)
 
     def _get_image_job_names(self, image_name: str, geometry_type: str) -> List[str]:
         # The image could be in multiple jobs. Also, filter for the requested label type.
-        job_names = []
-        for job in self.jobs:
-            for job_image in job.entities:
-                if (
-                    job_image["name"] == image_name
-                    and self.job_statistics[job.name]["geometry_type"] == geometry_type
-                ):
-                    job_names.append(job.name)
-        return job_names
+        return [
+            job_name
+            for job_name in self.image_job_names.get(image_name, [])
+            if self.job_statistics[job_name]["geometry_type"] == geometry_type
+        ]
+
+    def _add_job_statistics(
+        self, job_name: str, geometry_type: str, statistics: Dict[str, int]
+    ):
+        if job_name not in self.job_statistics.keys():
+            self.job_statistics[job_name] = {
+                "geometry_type": geometry_type,
+                "number_labels": 0,
+                "number_issues": 0,
+                "number_fixed": 0,
+            }
+        for key, value in statistics.items():
+            self.job_statistics[job_name][key] += value
 
-    def _found_label_in_jobless_image(
+    def _found_labels_in_jobless_image(
         self,
         project_name: str,
         dataset_name: str,
         geometry_type: str,
-        found_issue: bool = False,
-        fixed_issue: int = 0,
+        statistics: Dict[str, int],
     ):
         # Create pseudo job for "project - dataset - geometry" to account for images that are not assigned to any job
         pseudo_job_name = f"{project_name} - {dataset_name} - {geometry_type}"
-        if pseudo_job_name not in self.job_statistics.keys():
-            self.job_statistics[pseudo_job_name] = {
-                "geometry_type": geometry_type,
-                "number_labels": 0,
-                "number_issues": 0,
-                "number_fixed": 0,
-            }
-        self.job_statistics[pseudo_job_name]["number_labels"] += 1
-        self.job_statistics[pseudo_job_name]["number_issues"] += int(found_issue)
-        self.job_statistics[pseudo_job_name]["number_fixed"] += fixed_issue
+        self._add_job_statistics(pseudo_job_name, geometry_type, statistics)
 
     def _run_project(self, project, project_meta):
         for dataset in self.datasets[project.name]:
             self._run_dataset(dataset, project_meta, project.name)
 
     def _run_dataset(self, dataset, project_meta, project_name: str):
-        # These are all images in the dataset
-        images = safe_request(self.sly_api.image.get_list, dataset.id)
-
         with tqdm(
-            total=len(images),
             desc=f"Processing dataset: {project_name} - {dataset.name}",
         ) as pbar:
-            # Batch images to reduce the number of API calls
-            for batch in sly.batched(images, batch_size=50):
-                image_ids = [image.id for image in batch]
-                annotations = safe_request(
-                    self.sly_api.annotation.download_batch, dataset.id, image_ids
-                )
-                updated_annotations = {"image_ids": [], "annotations": []}
-
-                # Iterate over images in batch
-                for image in annotations:
-                    # We use this object to update the labels. All checkers share the same instance.
-                    updated_annotation = sly.Annotation.from_json(
-                        image.annotation, project_meta
-                    )
-                    image_checker = ImageChecker(
-                        image.image_name,
-                        updated_annotation,
-                        not self.dry_run,
-                        self.verbose,
+            # The images are listed page by page such that checking starts with the first page
+            for images, number_images in iterate_image_pages(self.sly_api, dataset.id):
+                if pbar.total is None:
+                    pbar.total = number_images
+                    pbar.refresh()
+                # Batch images to reduce the number of API calls
+                for batch in sly.batched(images, batch_size=50):
+                    image_ids = [image.id for image in batch]
+                    annotations = safe_request(
+                        self.sly_api.annotation.download_batch, dataset.id, image_ids
                     )
-                    bounding_box_checker = BoundingBoxChecker(
-                        image.image_name,
-                        image.annotation["size"]["height"],
-                        image.annotation["size"]["width"],
-                        project_meta,
-                        updated_annotation,
-                        not self.dry_run,
-                        self.verbose,
-                    )
-                    segmentation_checker = SegmentationChecker(
-                        image.image_name,
-                        image.annotation["size"]["height"],
-                        image.annotation["size"]["width"],
-                        project_meta,
-                        updated_annotation,
-                        not self.dry_run,
-                        self.verbose,
-                    )
-                    bounding_box_job_names = self._get_image_job_names(
-                        image.image_name, "rectangle"
-                    )
-                    segmentation_job_names = self._get_image_job_names(
-                        image.image_name, "bitmap"
+
+                    # The images are checked concurrently, the results are processed in order
+                    check_results = self.check_executor.map(
+                        lambda image: self._check_image_timed(image, project_meta),
+                        annotations,
                     )
 
-                    # Run image-level checks
-                    image_checker.run()
-
-                    # Iterate over labels in current image
-                    for label in image.annotation["objects"]:
-                        if not label["geometryType"] in self.label_types_to_check:
-                            continue
-                        # We do not convert to a SLY object since it is easier to operate with the JSON dictionary
-                        if label["geometryType"] == "rectangle":
-                            bounding_box_checker.run(label)
-                        elif label["geometryType"] == "bitmap":
-                            segmentation_checker.run(label)
-                        else:
-                            Logger.log_warn(
-                                f"Found unsupported geometry type: {label['geometryType']}"
+                    # Iterate over images in batch
+                    for image, (
+                        updated_annotation,
+                        is_annotation_updated,
+                        check_time,
+                    ) in zip(annotations, check_results):
+                        # Only serialize the annotation if it has to be uploaded.
+                        #  Otherwise, the original JSON contains the same tags.
+                        annotation_json = image.annotation
+                        if is_annotation_updated:
+                            annotation_json = updated_annotation.to_json()
+                            self.annotation_uploader.add(
+                                image.image_id, annotation_json
                             )
 
-                    # Assertion that the memory still matches
-                    if (
-                        id(Checker.updated_annotation)
-                        != id(image_checker.updated_annotation)
-                        or id(Checker.updated_annotation)
-                        != id(bounding_box_checker.updated_annotation)
-                        or id(Checker.updated_annotation)
-                        != id(segmentation_checker.updated_annotation)
-                    ):
-                        raise RuntimeError("Memory addresses do not match.")
-
-                    # One of the checkers changed the annotation (image tags or labels)
-                    if Checker.is_annotation_updated:
-                        updated_annotations["image_ids"].append(image.image_id)
-                        updated_annotations["annotations"].append(
-                            Checker.updated_annotation
-                        )
-
-                    # Count number of issues and labels in this image
-                    for label in LabelChecker.updated_annotation.to_json()["objects"]:
-                        if "unknown" in label["classTitle"]:
-                            continue
-                        found_issue = LabelChecker.is_issue_tagged(
-                            label
-                        ) and not LabelChecker.is_resolved_tagged(label)
-                        fixed_issues = LabelChecker.get_fixed_issue_tag_value(label)
-                        if label["geometryType"] == "rectangle":
-                            if bounding_box_job_names:
-                                for job_name in bounding_box_job_names:
-                                    self.job_statistics[job_name]["number_labels"] += 1
-                                    self.job_statistics[job_name][
-                                        "number_issues"
-                                    ] += int(found_issue)
-                                    self.job_statistics[job_name][
-                                        "number_fixed"
-                                    ] += fixed_issues
-                            else:
-                                self._found_label_in_jobless_image(
-                                    project_name,
-                                    dataset.name,
-                                    "rectangle",
-                                    found_issue,
-                                    fixed_issues,
+                        label_statistics = count_label_statistics(annotation_json)
+                        image_job_names = []
+                        for geometry_type, statistics in label_statistics.items():
+                            job_names = self._get_image_job_names(
+                                image.image_name, geometry_type
+                            )
+                            image_job_names += job_names
+                            for job_name in job_names:
+                                self._add_job_statistics(
+                                    job_name, geometry_type, statistics
                                 )
-                        elif label["geometryType"] == "bitmap":
-                            if segmentation_job_names:
-                                for job_name in segmentation_job_names:
-                                    self.job_statistics[job_name]["number_labels"] += 1
-                                    self.job_statistics[job_name][
-                                        "number_issues"
-                                    ] += int(found_issue)
-                                    self.job_statistics[job_name][
-                                        "number_fixed"
-                                    ] += fixed_issues
-                            else:
-                                self._found_label_in_jobless_image(
+                            if not job_names:
+                                self._found_labels_in_jobless_image(
                                     project_name,
                                     dataset.name,
-                                    "bitmap",
-                                    found_issue,
-                                    fixed_issues,
+                                    geometry_type,
+                                    statistics,
                                 )
 
-                    pbar.update(1)
-
-                # Upload all annotations in the current batch if there are any
-                if updated_annotations["image_ids"] and not self.dry_run:
-                    safe_request(
-                        self.sly_api.annotation.upload_anns,
-                        updated_annotations["image_ids"],
-                        updated_annotations["annotations"],
-                    )
+                        self._stream_image_results(
+                            project_name,
+                            dataset.name,
+                            image.image_name,
+                            annotation_json,
+                            label_statistics,
+                            is_annotation_updated,
+                            check_time,
+                            image_job_names,
+                        )
+                        pbar.update(1)
+
+    def _check_image_timed(self, image, project_meta):
+        start_time = time.perf_counter()
+        updated_annotation, is_annotation_updated = check_image(
+            image.image_name,
+            image.annotation,
+            project_meta,
+            self.label_types_to_check,
+            not self.dry_run,
+            self.verbose,
+        )
+        return (
+            updated_annotation,
+            is_annotation_updated,
+            time.perf_counter() - start_time,
+        )
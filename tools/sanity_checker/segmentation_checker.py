@@ -3,6 +3,7 @@ import supervisely_lib as sly
 from scipy import ndimage
 
 from similarity_scorer.utils.logger import Logger
+from .check_registry import check_registry
 from .label_checker import LabelChecker, check_label_existence
 
 
@@ -10,8 +11,11 @@ class SegmentationChecker(LabelChecker):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # We use this to check for overlapping labels within an image
-        self.image_mask = np.zeros((self.image_height, self.image_width), dtype=np.int)
+        # We use this to check for overlapping labels within an image.
+        #  A pixel is set if it belongs to any of the previously checked labels.
+        self.image_mask = np.zeros((self.image_height, self.image_width), dtype=bool)
+        # Set if a fix changed the mask of the current label
+        self.is_mask_updated = False
 
     def run(self, label: dict):
         if label["geometryType"] != "bitmap":
@@ -24,21 +28,22 @@ class SegmentationChecker(LabelChecker):
         # Run all checks on the same label.
         self.label = label
 
-        # Create numpy array from bitmap
+        # Create numpy array from bitmap. All checks and fixes operate on this mask.
         self.label["mask"] = sly.Bitmap.base64_2_data(self.label["bitmap"]["data"])
+        self.is_mask_updated = False
 
         is_ok = True
-        is_ok &= not self._is_small_label(minimum_area=10, delete_threshold_area=5)
-        is_ok &= not self._is_outside_image_frame(image_border_size=140)
-        is_ok &= not self._is_ghost_bounding_box()
-        is_ok &= not self._is_perforated()
-        is_ok &= not self._is_separated(number_pixels=15)
-        is_ok &= not self._is_overlapping_label()
-        is_ok &= not self._is_distorted_box(
-            minimum_ratio=0.5, maximum_ratio=3.0
-        )  # Should be after ghost_box check
+        for check in check_registry.get_enabled_checks("bitmap"):
+            is_ok &= not check(self)
+
+        # The fixed mask is only encoded once, no matter how many fixes were applied
+        if self.label is not None and self.is_mask_updated:
+            self._update_bitmap_data()
         return is_ok
 
+    @check_registry.register(
+        "bitmap", "small_label", minimum_area=10, delete_threshold_area=5
+    )
     @check_label_existence
     def _is_small_label(self, minimum_area: int, delete_threshold_area: int = -1):
         is_small_label = np.sum(self.label["mask"]) < minimum_area
@@ -60,32 +65,12 @@ class SegmentationChecker(LabelChecker):
             self.label = None
         return is_small_label
 
-    @check_label_existence
-    def _is_overlapping_label(self):
-        # Check if a single pixel belongs to multiple instance masks
-
-        mask = self.label["mask"]
-        origin = self.label["bitmap"]["origin"]
-        self.image_mask[
-            origin[1] : origin[1] + mask.shape[0],
-            origin[0] : origin[0] + mask.shape[1],
-        ][mask == 1] += mask[mask == 1]
-        is_overlapping_label = np.max(self.image_mask) > 1
-
-        # Reset the check so that other labels do not trigger it again just because it has been triggered before
-        self.image_mask[self.image_mask > 1] = 1
-
-        self._update_issue_tag(self.label, "Overlapping label", is_overlapping_label)
-
-        if self.verbose and is_overlapping_label:
-            Logger.log_info_alt(f"{self.image_name} | segmentation | overlapping label")
-        return is_overlapping_label
-
+    @check_registry.register("bitmap", "outside_image_frame", image_border_size=140)
     @check_label_existence
     def _is_outside_image_frame(self, image_border_size: int):
         # Check if the label reaches into the black border (watermark)
 
-        mask = self.label["mask"].copy()
+        mask = self.label["mask"]
         origin = self.label["bitmap"]["origin"]
         min_x, max_x = origin[0], origin[0] + mask.shape[1]  # width
         min_y, max_y = origin[1], origin[1] + mask.shape[0]  # height
@@ -102,16 +87,15 @@ class SegmentationChecker(LabelChecker):
             )
         elif is_outside_image_frame:
             # Remove annotated pixels outside the main image, i.e., inside the watermark
-            mask[:, : image_border_size - min_x] = False
-            mask[:, self.image_width - image_border_size - min_x :] = False
-            mask[: image_border_size - min_y, :] = False
-            mask[self.image_height - image_border_size - min_y :, :] = False
+            mask[:, : max(0, image_border_size - min_x)] = False
+            mask[:, max(0, self.image_width - image_border_size - min_x) :] = False
+            mask[: max(0, image_border_size - min_y), :] = False
+            mask[max(0, self.image_height - image_border_size - min_y) :, :] = False
             # If all pixels were outside the main image, we delete the entire label
             if not np.any(mask):
                 self._delete_label(self.label)
             else:
-                self.label["bitmap"]["data"] = sly.Bitmap.data_2_base64(mask)
-                self._update_bitmap_data()
+                self._set_mask(mask)
                 # Remove issue tag if it previously existed
                 self._delete_issue_tag(self.label, "Inside watermark")
                 # Increment fixed_issue counter
@@ -125,21 +109,26 @@ class SegmentationChecker(LabelChecker):
             is_outside_image_frame = False
         return is_outside_image_frame
 
+    @check_registry.register("bitmap", "ghost_bounding_box")
     @check_label_existence
     def _is_ghost_bounding_box(self):
         # Sometimes the inferred bounding box is larger than the actual mask
 
-        # We just convert the mask back to the encrypted version and check for differences
-        data = sly.Bitmap.data_2_base64(self.label["mask"])
-        is_ghost_bounding_box = self.label["bitmap"]["data"] != data
+        # This shows as empty rows or columns at the border of the mask
+        mask = self.label["mask"]
+        is_ghost_bounding_box = np.any(mask) and not (
+            np.any(mask[0, :])
+            and np.any(mask[-1, :])
+            and np.any(mask[:, 0])
+            and np.any(mask[:, -1])
+        )
 
         if not self.apply_auto_fixes:
             self._update_issue_tag(
                 self.label, "Ghost bounding box", is_ghost_bounding_box
             )
         elif is_ghost_bounding_box:
-            self.label["bitmap"]["data"] = data
-            self._update_bitmap_data()
+            self._set_mask(mask)
             # Remove issue tag if it previously existed
             self._delete_issue_tag(self.label, "Ghost bounding box")
             # Increment fixed_issue counter
@@ -153,28 +142,7 @@ class SegmentationChecker(LabelChecker):
             is_ghost_bounding_box = False
         return is_ghost_bounding_box
 
-    @check_label_existence
-    def _is_distorted_box(self, minimum_ratio: float, maximum_ratio: float):
-        # maximum_ratio: height to width
-        # The reasons for a distorted box could be that the mask covers multiple labels or
-        #  there are some pixels that have been accidentally labeled but are separated
-
-        ratio = self.label["mask"].shape[0] / self.label["mask"].shape[1]
-        greater_max_ratio = ratio > maximum_ratio
-        smaller_min_ratio = ratio < minimum_ratio
-        is_distorted_box = greater_max_ratio or smaller_min_ratio
-
-        self._update_issue_tag(self.label, "Suspicious aspect ratio", is_distorted_box)
-
-        if self.verbose and is_distorted_box:
-            log_text = f"{self.image_name} | segmentation | aspect ratio ({np.round(ratio, 1)} "
-            if greater_max_ratio:
-                log_text += f"> {maximum_ratio})"
-            elif smaller_min_ratio:
-                log_text += f"< {minimum_ratio})"
-            Logger.log_info_alt(log_text)
-        return is_distorted_box
-
+    @check_registry.register("bitmap", "perforated")
     @check_label_existence
     def _is_perforated(self):
         # Check for holes in the segmentation mask
@@ -186,15 +154,12 @@ class SegmentationChecker(LabelChecker):
         if not self.apply_auto_fixes:
             self._update_issue_tag(self.label, "Perforated label", is_perforated)
         elif is_perforated:
-            self.label["bitmap"]["data"] = sly.Bitmap.data_2_base64(updated_mask)
-            self._update_bitmap_data()
+            self._set_mask(updated_mask)
             # Remove issue tag if it previously existed
             self._delete_issue_tag(self.label, "Perforated label")
             # Increment fixed_issue counter
             self._increment_fixed_issue_tag(self.label)
 
-        self._update_issue_tag(self.label, "Perforated label", is_perforated)
-
         if self.verbose and is_perforated:
             log_text = f"{self.image_name} | segmentation | perforated label"
             log_text += " --> fixed" if self.apply_auto_fixes else ""
@@ -203,6 +168,7 @@ class SegmentationChecker(LabelChecker):
             is_perforated = False
         return is_perforated
 
+    @check_registry.register("bitmap", "separated", number_pixels=15)
     @check_label_existence
     def _is_separated(self, number_pixels: int):
         # Check for pixels separated from the main mask
@@ -225,8 +191,7 @@ class SegmentationChecker(LabelChecker):
             if not np.sum(updated_mask):
                 remove_label = True
             else:
-                self.label["bitmap"]["data"] = sly.Bitmap.data_2_base64(updated_mask)
-                self._update_bitmap_data()
+                self._set_mask(updated_mask)
                 # Remove issue tag if it previously existed
                 self._delete_issue_tag(self.label, "Separated label")
                 # Increment fixed_issue counter
@@ -244,9 +209,88 @@ class SegmentationChecker(LabelChecker):
             self.label = None
         return is_separated
 
+    @check_registry.register("bitmap", "overlapping_label")
+    @check_label_existence
+    def _is_overlapping_label(self):
+        # Check if a single pixel belongs to multiple instance masks
+
+        # Only the bounding box of the label is touched, i.e., the cost does not depend on the image size
+        mask = self.label["mask"]
+        origin = self.label["bitmap"]["origin"]
+        min_x, min_y = max(origin[0], 0), max(origin[1], 0)
+        max_x = min(origin[0] + mask.shape[1], self.image_width)
+        max_y = min(origin[1] + mask.shape[0], self.image_height)
+        is_overlapping_label = False
+        # Labels entirely outside the image cannot overlap
+        if min_x < max_x and min_y < max_y:
+            mask = mask[
+                min_y - origin[1] : max_y - origin[1],
+                min_x - origin[0] : max_x - origin[0],
+            ].astype(bool)
+            image_mask_crop = self.image_mask[min_y:max_y, min_x:max_x]
+            is_overlapping_label = bool(np.any(image_mask_crop & mask))
+            # Mark the pixels of this label for the following labels
+            image_mask_crop |= mask
+
+        self._update_issue_tag(self.label, "Overlapping label", is_overlapping_label)
+
+        if self.verbose and is_overlapping_label:
+            Logger.log_info_alt(f"{self.image_name} | segmentation | overlapping label")
+        return is_overlapping_label
+
+    # Should be after the ghost bounding box check
+    @check_registry.register(
+        "bitmap", "distorted_box", minimum_ratio=0.5, maximum_ratio=3.0
+    )
+    @check_label_existence
+    def _is_distorted_box(self, minimum_ratio: float, maximum_ratio: float):
+        # maximum_ratio: height to width
+        # The reasons for a distorted box could be that the mask covers multiple labels or
+        #  there are some pixels that have been accidentally labeled but are separated
+
+        ratio = self.label["mask"].shape[0] / self.label["mask"].shape[1]
+        greater_max_ratio = ratio > maximum_ratio
+        smaller_min_ratio = ratio < minimum_ratio
+        is_distorted_box = greater_max_ratio or smaller_min_ratio
+
+        self._update_issue_tag(self.label, "Suspicious aspect ratio", is_distorted_box)
+
+        if self.verbose and is_distorted_box:
+            log_text = f"{self.image_name} | segmentation | aspect ratio ({np.round(ratio, 1)} "
+            if greater_max_ratio:
+                log_text += f"> {maximum_ratio})"
+            elif smaller_min_ratio:
+                log_text += f"< {minimum_ratio})"
+            Logger.log_info_alt(log_text)
+        return is_distorted_box
+
+    def _set_mask(self, mask: np.ndarray):
+        # Crop empty rows and columns at the border and shift the origin accordingly.
+        # This matches what sly.Bitmap does when the label is created from the mask.
+        rows = np.flatnonzero(np.any(mask, axis=1))
+        columns = np.flatnonzero(np.any(mask, axis=0))
+        origin = self.label["bitmap"]["origin"]
+        self.label["bitmap"]["origin"] = [
+            origin[0] + int(columns[0]),
+            origin[1] + int(rows[0]),
+        ]
+        self.label["mask"] = mask[rows[0] : rows[-1] + 1, columns[0] : columns[-1] + 1]
+        self.is_mask_updated = True
+
     def _update_bitmap_data(self):
-        updated_label = sly.Label.from_json(self.label, self.project_meta)
-        self._update_label(updated_label)
-        # Update label object for later checks
-        self.label = updated_label.to_json()
-        self.label["mask"] = sly.Bitmap.base64_2_data(self.label["bitmap"]["data"])
+        # Replace the geometry of the label in the updated annotation but keep its tags
+        for candidate_label in self.context.updated_annotation.labels:
+            if candidate_label.geometry.sly_id == self.label["id"]:
+                geometry = candidate_label.geometry
+                origin = self.label["bitmap"]["origin"]
+                bitmap = sly.Bitmap(
+                    self.label["mask"],
+                    origin=sly.PointLocation(row=origin[1], col=origin[0]),
+                    sly_id=geometry.sly_id,
+                    class_id=geometry.class_id,
+                    labeler_login=geometry.labeler_login,
+                    updated_at=geometry.updated_at,
+                    created_at=geometry.created_at,
+                )
+                self._update_label(candidate_label.clone(geometry=bitmap))
+                break
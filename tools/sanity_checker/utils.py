@@ -1,21 +1,132 @@
+import random
 import sys
+import threading
+import time
+from typing import Optional
 
-from requests.exceptions import HTTPError
+from requests.exceptions import (
+    HTTPError,
+    ConnectionError as RequestsConnectionError,
+    Timeout,
+)
 from difflib import SequenceMatcher
 
 from similarity_scorer.utils.logger import Logger
 
+# Retry transient server errors with exponential backoff before giving up
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 120.0
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class RequestStatistics:
+    def __init__(self):
+        self.number_requests = 0
+        self.number_retries = 0
+        self.number_failures = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # Requests are issued concurrently from the check and upload threads
+        self._lock = threading.Lock()
+
+    def add_request(self, latency: float):
+        with self._lock:
+            self.number_requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def add_retry(self):
+        with self._lock:
+            self.number_retries += 1
+
+    def add_failure(self):
+        with self._lock:
+            self.number_failures += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "number_requests": self.number_requests,
+                "number_retries": self.number_retries,
+                "number_failures": self.number_failures,
+                "total_latency": round(self.total_latency, 3),
+                "mean_latency": round(
+                    self.total_latency / max(self.number_requests, 1), 3
+                ),
+                "max_latency": round(self.max_latency, 3),
+            }
+
+
+# Shared by all requests issued via safe_request()
+request_statistics = RequestStatistics()
+
+
+def _get_retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    # Returns None if the error is not transient, i.e., retrying would not help
+    response = getattr(error, "response", None)
+    if response is None:
+        # Connection errors and timeouts do not come with a response
+        if isinstance(error, (RequestsConnectionError, Timeout)):
+            return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        return None
+    if response.status_code not in RETRY_STATUS_CODES:
+        return None
+
+    # Respect the rate limit announced by the server
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return min(BACKOFF_MAX_SECONDS, float(retry_after))
+        except ValueError:
+            pass
+    # Add some jitter so that parallel runs do not retry in lockstep
+    delay = BACKOFF_BASE_SECONDS * 2 ** attempt
+    return min(BACKOFF_MAX_SECONDS, delay + random.uniform(0, BACKOFF_BASE_SECONDS))
+
 
 def safe_request(request, *args, **kwargs):
-    try:
-        return request(*args, **kwargs)
-    except HTTPError as e:
-        Logger.log_error(e.__str__())
-        sys.exit(-1)
+    for attempt in range(MAX_RETRIES + 1):
+        start_time = time.perf_counter()
+        try:
+            response = request(*args, **kwargs)
+            request_statistics.add_request(time.perf_counter() - start_time)
+            return response
+        except (HTTPError, RequestsConnectionError, Timeout) as e:
+            request_statistics.add_request(time.perf_counter() - start_time)
+            delay = _get_retry_delay(e, attempt)
+            if delay is None or attempt == MAX_RETRIES:
+                request_statistics.add_failure()
+                Logger.log_error(e.__str__())
+                sys.exit(-1)
+            request_statistics.add_retry()
+            Logger.log_warn(
+                f"Request failed ({e}). Retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s."
+            )
+            time.sleep(delay)
     Logger.log_error("An unknown exception occurred.")
     sys.exit(-1)
 
 
+def iterate_image_pages(sly_api, dataset_id: int, per_page: int = 500):
+    # Lazy version of sly_api.image.get_list() that yields (images of one page, total number of images)
+    page = 1
+    while True:
+        response = safe_request(
+            sly_api.post,
+            "images.list",
+            {"datasetId": dataset_id, "page": page, "per_page": per_page},
+        ).json()
+        images = [
+            sly_api.image._convert_json_info(entity)  # pylint: disable=protected-access
+            for entity in response["entities"]
+        ]
+        yield images, response["total"]
+        if page >= response["pagesCount"]:
+            break
+        page += 1
+
+
 def extract_geometry_type_from_job_name(job_name: str):
     rectangle_name = "Bounding Boxes".lower()
     bitmap_name = "Segmentation".lower()
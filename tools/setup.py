@@ -41,6 +41,7 @@ setup(
         "torch>=1.4.0",
         "img2vec_pytorch",
         "pandas",
+        "pyarrow",
         "matplotlib",
         "screeninfo",
         "networkx",
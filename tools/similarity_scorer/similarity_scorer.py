@@ -207,10 +207,15 @@ class SimilarityScorer:
             self.similarity_viewer.show_samples()
 
     def collect_stats(self, cache_use_file_hash: bool):
-        # extract features
-        feature_vectors = self.extractor.extract_feature_vectors_for_files(
-            self.image_glob, cache_use_file_hash
-        )
+        self.start_collect_stats(cache_use_file_hash)
+        return self.finish_collect_stats()
+
+    def start_collect_stats(self, cache_use_file_hash: bool):
+        # The features are extracted in the background until finish_collect_stats() is called
+        self.extractor.start_extraction(self.image_glob, cache_use_file_hash)
+
+    def finish_collect_stats(self):
+        feature_vectors = self.extractor.finish_extraction()
 
         self._calculate_metrics(feature_vectors)
         self._prepare_results()
@@ -57,6 +57,12 @@ class FeatureExtractor:
         use_gpu = gpu
 
         self._cache = None
+        # State of a running extraction, see start_extraction()
+        self._files = []
+        self._pool = None
+        self._results = None
+        self._cache_use_file_hash = False
+        self._start_time = 0.0
         self.cache_file = (
             cache_dir / CACHE_FILE if cache_dir is not None else Path(CACHE_FILE)
         )
@@ -85,16 +91,18 @@ class FeatureExtractor:
 
         return model_found
 
-    def _pool_process_init(self):
+    def _pool_process_init(self, worker_counter=None):
         global img2vec, use_gpu, process_local_cache
         # somewhat inefficient as the model gets loaded to GPU as many times as there are processes!
         # but so far good enough
 
-        process_id = (
-            int(mp.current_process().name.split("-")[1])  # pylint: disable=not-callable
-            if not DEBUG_DISABLE_MULTIPROCESSING
-            else 1
-        )
+        # The workers count themselves, the process name depends on how many pools have been created before
+        if worker_counter is not None:
+            with worker_counter.get_lock():
+                worker_counter.value += 1
+                process_id = worker_counter.value
+        else:
+            process_id = 1
         use_gpu = use_gpu and torch.cuda.is_available()
 
         if USE_CACHE and self.cache_file.exists():
@@ -154,19 +162,54 @@ class FeatureExtractor:
     def extract_feature_vectors_for_files(
         self, image_glob: str, cache_use_file_hash: bool = False
     ):
+        self.start_extraction(image_glob, cache_use_file_hash)
+        return self.finish_extraction()
+
+    def start_extraction(self, image_glob: str, cache_use_file_hash: bool = False):
+        """
+        Starts the worker pool without waiting for the results, see finish_extraction().
+        This allows the caller to do other work in the main thread while the features are extracted.
+        """
         Logger.log_info("Start extracting feature vectors ...")
 
         files = sorted([Path(f) for f in glob(image_glob)])
-        files = [f for f in files if f.is_file()]
+        self._files = [f for f in files if f.is_file()]
+        self._cache_use_file_hash = cache_use_file_hash
 
-        if len(files) == 0:
+        if len(self._files) == 0:
             Logger.log_error(f"Found no files for glob {image_glob}!")
             exit(-1)
         else:
-            Logger.log_info(f"Found {len(files)} files to check.")
+            Logger.log_info(f"Found {len(self._files)} files to check.")
             time.sleep(0.05)  # just display stuff
 
-        start_time = time.time()
+        self._start_time = time.time()
+
+        if not DEBUG_DISABLE_MULTIPROCESSING:
+            self._pool = mp.Pool(
+                self.num_workers,
+                initializer=self._pool_process_init,
+                initargs=(mp.Value("i", 0),),
+            )
+            # The results are computed in the background and collected in finish_extraction()
+            self._results = self._pool.imap_unordered(
+                partial(
+                    FeatureExtractor._extract_features_from_image,
+                    cache_use_file_hash=cache_use_file_hash,
+                ),
+                self._files,
+            )
+
+    def abort_extraction(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._results = None
+
+    def finish_extraction(self):
+        files = self._files
+        start_time = self._start_time
 
         with tqdm(
             total=len(files), desc="extracting feature vectors", unit="images"
@@ -177,7 +220,7 @@ class FeatureExtractor:
                 for res in map(
                     partial(
                         FeatureExtractor._extract_features_from_image,
-                        cache_use_file_hash=cache_use_file_hash,
+                        cache_use_file_hash=self._cache_use_file_hash,
                     ),
                     files,
                 ):
@@ -185,18 +228,15 @@ class FeatureExtractor:
                     pbar.update(1)
             else:
                 results = []
-                with mp.Pool(
-                    self.num_workers, initializer=self._pool_process_init
-                ) as pool:
-                    for res in pool.imap_unordered(
-                        partial(
-                            FeatureExtractor._extract_features_from_image,
-                            cache_use_file_hash=cache_use_file_hash,
-                        ),
-                        files,
-                    ):
+                try:
+                    for res in self._results:
                         results.append(res)
                         pbar.update(1)
+                    self._pool.close()
+                    self._pool.join()
+                finally:
+                    # Also stops the workers if collecting the results failed
+                    self.abort_extraction()
 
         duration = time.time() - start_time
 
@@ -0,0 +1,195 @@
+import errno
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+cv = pytest.importorskip("cv2")
+
+from label_converters import image_export  # noqa: E402
+
+WIDTH, HEIGHT = 640, 480
+
+
+def _write_jpeg(path, sampling_factor, exif=False):
+    image = np.random.default_rng(0).integers(0, 256, (HEIGHT, WIDTH, 3), np.uint8)
+    _, data = cv.imencode(
+        ".jpg", image, [cv.IMWRITE_JPEG_SAMPLING_FACTOR, sampling_factor]
+    )
+    data = data.tobytes()
+    if exif:
+        # Minimal APP1 segment with an empty TIFF directory right after the start of image marker
+        payload = b"Exif\x00\x00" + b"II*\x00\x08\x00\x00\x00" + bytes(6)
+        segment = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+        data = data[:2] + segment + data[2:]
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture
+def jpeg_420(tmp_path):
+    return _write_jpeg(tmp_path / "420.jpg", cv.IMWRITE_JPEG_SAMPLING_FACTOR_420)
+
+
+@pytest.fixture
+def jpeg_444(tmp_path):
+    return _write_jpeg(tmp_path / "444.jpg", cv.IMWRITE_JPEG_SAMPLING_FACTOR_444)
+
+
+@pytest.fixture
+def jpegtran_calls(monkeypatch):
+    # Records the calls of jpegtran instead of running it, a successful crop does not decode the image
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        return SimpleNamespace(returncode=0)
+
+    monkeypatch.setattr(image_export, "JPEGTRAN", "jpegtran")
+    monkeypatch.setattr(image_export.subprocess, "run", run)
+    return calls
+
+
+def _decoded_crop(src_file, border):
+    return cv.imread(str(src_file))[border:-border, border:-border, :]
+
+
+def test_read_jpeg_frame_420(jpeg_420):
+    assert image_export.read_jpeg_frame(jpeg_420) == (WIDTH, HEIGHT, 16, 16, False)
+
+
+def test_read_jpeg_frame_444(jpeg_444):
+    assert image_export.read_jpeg_frame(jpeg_444) == (WIDTH, HEIGHT, 8, 8, False)
+
+
+def test_read_jpeg_frame_exif(tmp_path):
+    jpeg = _write_jpeg(
+        tmp_path / "exif.jpg", cv.IMWRITE_JPEG_SAMPLING_FACTOR_420, exif=True
+    )
+    assert image_export.read_jpeg_frame(jpeg) == (WIDTH, HEIGHT, 16, 16, True)
+
+
+def test_read_jpeg_frame_png(tmp_path):
+    png = tmp_path / "image.png"
+    cv.imwrite(str(png), np.zeros((8, 8, 3), np.uint8))
+    assert image_export.read_jpeg_frame(png) is None
+
+
+def test_aligned_border_uses_jpegtran(jpeg_420, tmp_path, jpegtran_calls):
+    image_export.crop_image_border(jpeg_420, tmp_path / "cropped.jpg", 16)
+
+    assert len(jpegtran_calls) == 1
+    assert f"{WIDTH - 32}x{HEIGHT - 32}+16+16" in jpegtran_calls[0]
+
+
+def test_exif_forces_decoding(tmp_path, jpegtran_calls):
+    # OpenCV applies the EXIF orientation, a lossless crop would not
+    jpeg = _write_jpeg(
+        tmp_path / "exif.jpg", cv.IMWRITE_JPEG_SAMPLING_FACTOR_420, exif=True
+    )
+    dst_file = tmp_path / "cropped.jpg"
+
+    image_export.crop_image_border(jpeg, dst_file, 16)
+
+    assert jpegtran_calls == []
+    assert cv.imread(str(dst_file)).shape == (HEIGHT - 32, WIDTH - 32, 3)
+
+
+@pytest.mark.parametrize("jpeg_quality", [50, 90])
+def test_unaligned_border_is_encoded_with_quality(
+    jpeg_420, tmp_path, jpegtran_calls, jpeg_quality
+):
+    dst_file = tmp_path / "cropped.jpg"
+
+    image_export.crop_image_border(jpeg_420, dst_file, 140, jpeg_quality)
+
+    assert jpegtran_calls == []
+    _, expected = cv.imencode(
+        ".jpg",
+        _decoded_crop(jpeg_420, 140),
+        [cv.IMWRITE_JPEG_QUALITY, jpeg_quality],
+    )
+    assert dst_file.read_bytes() == expected.tobytes()
+
+
+def test_border_not_aligned_with_420_mcus(jpeg_420, tmp_path, jpegtran_calls):
+    # Aligned with 8 px blocks, but not with the 16 px MCUs of 4:2:0
+    image_export.crop_image_border(jpeg_420, tmp_path / "cropped.jpg", 24)
+
+    assert jpegtran_calls == []
+
+
+@pytest.mark.skipif(image_export.JPEGTRAN is None, reason="jpegtran is not installed")
+def test_lossless_crop_matches_decoded_crop(jpeg_444, tmp_path):
+    # With chroma subsampling, the upsampling at the new image border can differ, hence 4:4:4
+    dst_file = tmp_path / "cropped.jpg"
+
+    image_export.crop_image_border(jpeg_444, dst_file, 16)
+
+    np.testing.assert_array_equal(cv.imread(str(dst_file)), _decoded_crop(jpeg_444, 16))
+
+
+@pytest.fixture
+def src_file(tmp_path):
+    src_file = tmp_path / "src" / "image.jpg"
+    src_file.parent.mkdir()
+    src_file.write_bytes(os.urandom(1000))
+    return src_file
+
+
+@pytest.mark.parametrize("link_mode", image_export.LINK_MODES)
+def test_export_file(src_file, tmp_path, link_mode):
+    dst_file = tmp_path / "image.jpg"
+
+    image_export.export_file(src_file, dst_file, link_mode)
+
+    assert dst_file.read_bytes() == src_file.read_bytes()
+    assert dst_file.is_symlink() == (link_mode == "symlink")
+    # A reflink shares the data blocks, but not the inode
+    expected_links = 2 if link_mode == "hardlink" else 1
+    assert src_file.stat().st_nlink == expected_links
+    if link_mode == "symlink":
+        assert os.readlink(dst_file) == os.path.abspath(src_file)
+
+
+@pytest.mark.parametrize("link_mode", image_export.LINK_MODES)
+def test_export_file_replaces_destination(src_file, tmp_path, link_mode):
+    dst_file = tmp_path / "image.jpg"
+    dst_file.write_bytes(b"old")
+
+    image_export.export_file(src_file, dst_file, link_mode)
+
+    assert dst_file.read_bytes() == src_file.read_bytes()
+
+
+def test_hardlink_falls_back_to_copy(src_file, tmp_path, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(image_export.os, "link", link)
+    dst_file = tmp_path / "image.jpg"
+
+    image_export.export_file(src_file, dst_file, "hardlink")
+
+    assert dst_file.read_bytes() == src_file.read_bytes()
+    assert not dst_file.is_symlink()
+    assert src_file.stat().st_nlink == 1
+
+
+def test_unexpected_link_errors_are_raised(src_file, tmp_path, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(image_export.os, "link", link)
+
+    with pytest.raises(PermissionError):
+        image_export.export_file(src_file, tmp_path / "image.jpg", "hardlink")
+
+
+def test_unknown_link_mode(src_file, tmp_path):
+    with pytest.raises(ValueError):
+        image_export.export_file(src_file, tmp_path / "image.jpg", "junction")
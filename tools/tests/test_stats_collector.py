@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, TOOLS_DIR)
+
+# The stats collector requires the Supervisely SDK and the similarity scorer requires PyTorch
+pytest.importorskip("supervisely_lib")
+pytest.importorskip("torch")
+
+from collect_stats import stats_collector  # noqa: E402
+
+
+def _rectangle(class_title, exterior, tags=()):
+    return {
+        "description": "",
+        "geometryType": "rectangle",
+        "tags": [{"name": tag, "value": None} for tag in tags],
+        "classTitle": class_title,
+        "points": {"exterior": exterior, "interior": []},
+    }
+
+
+def _annotation(objects):
+    return {
+        "description": "",
+        "tags": [],
+        "size": {"height": 1080, "width": 1920},
+        "objects": objects,
+    }
+
+
+ANNOTATIONS = {
+    "empty": _annotation([]),
+    "ordered_corners": _annotation([_rectangle("blue_cone", [[100, 200], [150, 280]])]),
+    "unordered_corners": _annotation(
+        [
+            # bottom right -> top left
+            _rectangle("yellow_cone", [[150, 280], [100, 200]]),
+            # bottom left -> top right
+            _rectangle("orange_cone", [[300, 480], [340, 400]]),
+        ]
+    ),
+    "float_coordinates": _annotation(
+        [
+            _rectangle("large_orange_cone", [[10.2, 20.7], [60.8, 95.3]]),
+            _rectangle("unknown_cone", [[0.4, 0.6], [1919.3, 1079.9]]),
+        ]
+    ),
+    "tags": _annotation(
+        [
+            _rectangle("blue_cone", [[5, 5], [25, 45]], tags=["truncated"]),
+            _rectangle(
+                "yellow_cone",
+                [[500, 600], [520, 650]],
+                tags=["knocked_over", "sticker_band_removed"],
+            ),
+        ]
+    ),
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def project_meta():
+    with open(os.path.join(TOOLS_DIR, "label_converters", "meta.json")) as f:
+        stats_collector._pool_process_init(json.load(f))
+
+
+@pytest.mark.parametrize("name", sorted(ANNOTATIONS))
+def test_box_stats_match_sdk_parser(name):
+    annotation = ANNOTATIONS[name]
+    assert stats_collector._extract_boxes_from_json(
+        annotation
+    ) == stats_collector._extract_boxes_with_sdk(annotation)
+
+
+def test_empty_annotation_has_no_boxes():
+    assert stats_collector._extract_boxes_from_json(ANNOTATIONS["empty"]) == []
+
+
+@pytest.fixture
+def sly_project(tmp_path):
+    project_dir = tmp_path / "project"
+    for dataset_name in ["team_a", "team_b"]:
+        (project_dir / dataset_name / "img").mkdir(parents=True)
+        (project_dir / dataset_name / "ann").mkdir()
+        for name, annotation in ANNOTATIONS.items():
+            (project_dir / dataset_name / "img" / f"{name}.jpg").write_bytes(b"")
+            with open(
+                project_dir / dataset_name / "ann" / f"{name}.jpg.json", "w"
+            ) as f:
+                json.dump(annotation, f)
+    shutil.copy(
+        os.path.join(TOOLS_DIR, "label_converters", "meta.json"),
+        project_dir / "meta.json",
+    )
+    return project_dir
+
+
+def _collect_annotation_stats(sly_project, cache_dir, monkeypatch):
+    # Returns the stats and the number of parsed annotation files per dataset
+    monkeypatch.setattr(stats_collector, "DEBUG_DISABLE_MULTIPROCESSING", True)
+    parsed_files = []
+    extract_stats = stats_collector._extract_stats_from_annotation_file
+
+    def extract_stats_spy(task):
+        parsed_files.append(task[1])
+        return extract_stats(task)
+
+    monkeypatch.setattr(
+        stats_collector, "_extract_stats_from_annotation_file", extract_stats_spy
+    )
+
+    collector = stats_collector.StatsCollector(
+        calc_similarity=False, num_workers=1, use_gpu=False, cache_dir=cache_dir
+    )
+    assert collector.load_sly_project(str(sly_project))
+    stats, number_parsed = {}, {}
+    for dataset in collector.project:
+        parsed_files.clear()
+        stats[dataset.name] = collector._handle_dataset(dataset)
+        number_parsed[dataset.name] = len(parsed_files)
+    return stats, number_parsed
+
+
+def test_unchanged_annotations_are_cached(sly_project, tmp_path, monkeypatch):
+    stats, number_parsed = _collect_annotation_stats(sly_project, tmp_path, monkeypatch)
+    assert number_parsed == {"team_a": len(ANNOTATIONS), "team_b": len(ANNOTATIONS)}
+
+    cached_stats, number_parsed = _collect_annotation_stats(
+        sly_project, tmp_path, monkeypatch
+    )
+    assert number_parsed == {"team_a": 0, "team_b": 0}
+    assert cached_stats == stats
+
+
+def test_rewritten_annotations_are_cached(sly_project, tmp_path, monkeypatch):
+    stats, _ = _collect_annotation_stats(sly_project, tmp_path, monkeypatch)
+
+    # Same as downloading the project again, only the modification times change
+    ann_file = sly_project / "team_a" / "ann" / "tags.jpg.json"
+    content = ann_file.read_bytes()
+    stat = ann_file.stat()
+    ann_file.write_bytes(content)
+    os.utime(ann_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    cached_stats, number_parsed = _collect_annotation_stats(
+        sly_project, tmp_path, monkeypatch
+    )
+    assert number_parsed == {"team_a": 0, "team_b": 0}
+    assert cached_stats == stats
+
+
+def test_changed_annotations_are_parsed_again(sly_project, tmp_path, monkeypatch):
+    _collect_annotation_stats(sly_project, tmp_path, monkeypatch)
+
+    ann_file = sly_project / "team_a" / "ann" / "tags.jpg.json"
+    with open(ann_file, "w") as f:
+        json.dump(ANNOTATIONS["ordered_corners"], f)
+
+    stats, number_parsed = _collect_annotation_stats(sly_project, tmp_path, monkeypatch)
+    assert number_parsed == {"team_a": 1, "team_b": 0}
+    tags_stats = next(
+        stat for stat in stats["team_a"] if stat["ann_file"] == str(ann_file)
+    )
+    assert tags_stats["num_boxes"] == 1